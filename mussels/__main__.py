@@ -33,38 +33,156 @@ limitations under the License.
 """
 
 import logging
-import os
+import re
 import sys
 
 import click
-import coloredlogs
 
-import pkg_resources
-from mussels.mussels import Mussels
 from mussels.utils.click import MusselsModifier, ShortNames
 
-logging.basicConfig()
 module_logger = logging.getLogger("mussels")
-coloredlogs.install(level="DEBUG", fmt="%(asctime)s %(name)s %(levelname)s %(message)s")
-module_logger.setLevel(logging.DEBUG)
 
-from colorama import Fore, Back, Style
+
+class _ColorFormatter(logging.Formatter):
+    """
+    Log formatter that colors each record by level when writing to a terminal.
+    """
+
+    _COLORS = {
+        logging.DEBUG: "\x1b[36m",
+        logging.INFO: "\x1b[32m",
+        logging.WARNING: "\x1b[33m",
+        logging.ERROR: "\x1b[31m",
+        logging.CRITICAL: "\x1b[1;31m",
+    }
+    _RESET = "\x1b[0m"
+
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        self._tty = sys.stderr.isatty()
+
+    def format(self, record):
+        text = super().format(record)
+        color = self._COLORS.get(record.levelno)
+        if self._tty and color:
+            text = f"{color}{text}{self._RESET}"
+        return text
+
+
+def _configure_logging():
+    """
+    Set up console logging.
+
+    Deferred until a command creates a Mussels instance, the first thing that logs,
+    so that `--help` and usage errors don't pay for it.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        _ColorFormatter(
+            fmt="%(asctime)s %(name)s %(levelname)s %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+    )
+    logging.basicConfig(level=logging.DEBUG, handlers=[handler])
+    module_logger.setLevel(logging.DEBUG)
+
+
+def _mussels(**kwargs):
+    """
+    Import and construct the Mussels class on demand.
+
+    Importing mussels.mussels pulls in PyYAML, requests, etc.
+    so we only pay for it once we know a command needs it.
+
+    Instances are kept on the root click context, so commands that forward to
+    other commands (e.g. the aliases) share the already-loaded cookbooks
+    rather than loading them again.
+    """
+    from mussels.mussels import Mussels
+
+    instances = click.get_current_context().find_root().obj["mussels"]
+
+    key = tuple(sorted(kwargs.items()))
+    if key not in instances:
+        if not instances:
+            _configure_logging()
+        instances[key] = Mussels(**kwargs)
+
+    return instances[key]
+
+
+_RECIPE_RE = re.compile(r"^(?:([\w.\-+]+):)?([\w.\-+]+?)(?:@([\w.\-+]+))?$")
+
+
+def _parse_recipe_spec(spec: str, version: str, cookbook: str = "") -> tuple:
+    """
+    Split a `[cookbook:]recipe[@version]` argument into the recipe name, version, and cookbook.
+
+    Arguments that don't match (e.g. wildcard patterns) are returned as-is.
+
+    Returns:    A tuple of (recipe, version, cookbook).
+    """
+    match = _RECIPE_RE.match(spec)
+    if match is None:
+        return spec, version, cookbook
+
+    spec_cookbook, recipe, spec_version = match.groups()
+
+    if spec_version is not None:
+        if version != "":
+            raise click.UsageError(
+                f"Version given twice: '{spec}' and '--version {version}'."
+            )
+        version = spec_version
+
+    if spec_cookbook is not None:
+        if cookbook != "" and cookbook != spec_cookbook:
+            raise click.UsageError(
+                f"Cookbook given twice: '{spec}' and '--cookbook {cookbook}'."
+            )
+        cookbook = spec_cookbook
+
+    return recipe, version, cookbook
+
+
+def _epilog() -> str:
+    """
+    Build the epilog for the top-level help.
+
+    Looking up the installed version and importing colorama are deferred until
+    the help is actually shown.
+    """
+    from colorama import Fore, Style
+
+    try:
+        from importlib.metadata import version
+    except ImportError:
+        # Python 3.7
+        import pkg_resources
+
+        mussels_version = pkg_resources.get_distribution("mussels").version
+    else:
+        mussels_version = version("mussels")
+
+    return (
+        Fore.BLUE
+        + __doc__
+        + Fore.GREEN
+        + _description
+        + f"\nVersion {mussels_version}\n"
+        + Style.RESET_ALL
+        + _copyright
+    )
+
 
 #
 # CLI Interface
 #
-@click.group(
-    cls=MusselsModifier,
-    epilog=Fore.BLUE
-    + __doc__
-    + Fore.GREEN
-    + _description
-    + f"\nVersion {pkg_resources.get_distribution('mussels').version}\n"
-    + Style.RESET_ALL
-    + _copyright,
-)
-def cli():
-    pass
+@click.group(cls=MusselsModifier, epilog=_epilog)
+@click.pass_context
+def cli(ctx):
+    ctx.ensure_object(dict)
+    ctx.obj["mussels"] = {}
 
 
 @cli.group(cls=ShortNames, help="Commands that operate on cookbooks.")
@@ -80,37 +198,44 @@ def cookbook_list(verbose: bool):
     """
     Print the list of all known cookbooks.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True, load_cookbooks=False)
 
     my_mussels.list_cookbooks(verbose)
 
 
 @cookbook.command("show")
-@click.argument("cookbook", required=True)
+@click.argument("cookbook", nargs=-1, required=True)
 @click.option(
     "--verbose", "-V", is_flag=True, default=False, help="Verbose output. [optional]"
 )
-def cookbook_show(cookbook: str, verbose: bool):
+def cookbook_show(cookbook, verbose: bool):
     """
-    Show details about a specific cookbook.
+    Show details about one or more cookbooks.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True, load_cookbooks=False)
 
     my_mussels.show_cookbook(cookbook, verbose)
 
 
 @cookbook.command("update")
-def cookbook_update():
+@click.option(
+    "--jobs",
+    "-j",
+    default=0,
+    show_default=True,
+    help="Number of cookbooks to update at once, 0 for automatic. [optional]",
+)
+def cookbook_update(jobs: int):
     """
     Update the cookbooks from the internet.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True)
 
-    my_mussels.update_cookbooks()
+    my_mussels.update_cookbooks(jobs=jobs)
 
 
 @cookbook.command("trust")
-@click.argument("cookbook", required=True)
+@click.argument("cookbook", nargs=-1, required=True)
 @click.option(
     "--yes",
     "-y",
@@ -120,23 +245,23 @@ def cookbook_update():
 )
 def cookbook_trust(cookbook, yes):
     """
-    Trust a cookbook.
+    Trust one or more cookbooks.
     """
-    my_mussels = Mussels(load_all_recipes=True)
-
-    if yes != True:
-        print(
+    if not yes:
+        click.echo(
             f"\nDisclaimer: There is a non-zero risk when running code downloaded from the internet.\n"
         )
-        response = input(
-            f"Are you sure you would like to trust recipes from cookbook '{cookbook}'? [N/y] "
-        )
-        response = response.strip().lower()
-
-        if response != "y" and response != "yes":
+        if not click.confirm(
+            f"Are you sure you would like to trust recipes from cookbook(s) {', '.join(repr(book) for book in cookbook)}?",
+            default=False,
+        ):
             return
 
-    my_mussels.config_trust_cookbook(cookbook)
+    my_mussels = _mussels(load_all_recipes=True, load_cookbooks=False)
+
+    for book in cookbook:
+        my_mussels.config_trust_cookbook(book, defer_store=True)
+    my_mussels.flush_config()
 
 
 @cookbook.command("add")
@@ -150,24 +275,34 @@ def cookbook_trust(cookbook, yes):
     default=False,
     help="Add as a trusted cookbook, enabling you to build directly from this cookbook.",
 )
-def cookbook_add(cookbook, author, url, trust):
+@click.option(
+    "--full-history",
+    is_flag=True,
+    default=False,
+    help="Clone the full Git history instead of a shallow copy of the latest recipes. [optional]",
+)
+def cookbook_add(cookbook, author, url, trust, full_history):
     """
     Add a cookbook to the list of known cookbooks.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True, load_cookbooks=False)
 
-    my_mussels.config_add_cookbook(cookbook, author, url, trust=trust)
+    my_mussels.config_add_cookbook(
+        cookbook, author, url, trust=trust, full_history=full_history
+    )
 
 
 @cookbook.command("remove")
-@click.argument("cookbook", required=True)
+@click.argument("cookbook", nargs=-1, required=True)
 def cookbook_remove(cookbook):
     """
-    Remove a cookbook from the list of known cookbooks.
+    Remove one or more cookbooks from the list of known cookbooks.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True, load_cookbooks=False)
 
-    my_mussels.config_remove_cookbook(cookbook)
+    for book in cookbook:
+        my_mussels.config_remove_cookbook(book, defer_store=True)
+    my_mussels.flush_config()
 
 
 @cli.group(cls=ShortNames, help="Commands that operate on recipes.")
@@ -191,7 +326,7 @@ def recipe_list(verbose: bool, all: bool):
     Print the list of all known recipes.
     An asterisk indicates default (highest) version.
     """
-    my_mussels = Mussels(load_all_recipes=all)
+    my_mussels = _mussels(load_all_recipes=all)
 
     my_mussels.list_recipes(verbose)
 
@@ -213,9 +348,12 @@ def recipe_show(recipe: str, version: str, verbose: bool, all: bool):
     """
     Show details about a specific recipe.
     """
-    my_mussels = Mussels(load_all_recipes=all)
+    # The details list every cookbook that provides the recipe, so a cookbook prefix isn't needed.
+    recipe, version, _ = _parse_recipe_spec(recipe, version)
 
-    my_mussels.show_recipe(recipe, version, verbose)
+    my_mussels = _mussels(load_all_recipes=all)
+
+    my_mussels.show_recipe(recipe, version, verbose, all)
 
 
 @recipe.command("clone")
@@ -231,7 +369,9 @@ def recipe_clone(recipe: str, version: str, cookbook: str, dest: str):
     """
     Copy a recipe to the current directory or to a specific directory.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    recipe, version, cookbook = _parse_recipe_spec(recipe, version, cookbook)
+
+    my_mussels = _mussels(load_all_recipes=True)
 
     my_mussels.clone_recipe(recipe, version, cookbook, dest)
 
@@ -260,6 +400,24 @@ def recipe_clone(recipe: str, version: str, cookbook: str, dest: str):
     is_flag=True,
     help="Re-build a recipe, even if already built. [optional]",
 )
+@click.option(
+    "--rebuild-graph",
+    is_flag=True,
+    help="Re-resolve the dependency graph, even if a cached copy is available. [optional]",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    show_default=True,
+    help="Number of recipes to build at once. [optional]",
+)
+@click.option(
+    "--cas",
+    is_flag=True,
+    default=False,
+    help="Install unchanged recipes from the build cache rather than building them, and cache what is built. [optional]",
+)
 @click.option(
     "--install", "-i", default="", help="Install directory. [optional] Default is: ~/.mussels/install/<target>"
 )
@@ -279,6 +437,9 @@ def recipe_build(
     target: str,
     dry_run: bool,
     rebuild: bool,
+    rebuild_graph: bool,
+    jobs: int,
+    cas: bool,
     install: str,
     work_dir: str,
     log_dir: str,
@@ -287,18 +448,25 @@ def recipe_build(
     """
     Download, extract, build, and install a recipe.
     """
+    recipe, version, cookbook = _parse_recipe_spec(recipe, version, cookbook)
 
-    my_mussels = Mussels(
+    my_mussels = _mussels(
         install_dir=install,
         work_dir=work_dir,
         log_dir=log_dir,
         download_dir=download_dir,
     )
 
-    results = []
-
-    success = my_mussels.build_recipe(
-        recipe, version, cookbook, target, results, dry_run, rebuild
+    success, _ = my_mussels.build_recipe(
+        recipe,
+        version,
+        cookbook,
+        target,
+        dry_run,
+        rebuild,
+        rebuild_graph,
+        jobs,
+        cas,
     )
     if success == False:
         sys.exit(1)
@@ -327,7 +495,7 @@ def tool_list(verbose: bool, all: bool):
     Print the list of all known tools.
     An asterisk indicates default (highest) version.
     """
-    my_mussels = Mussels(load_all_recipes=all)
+    my_mussels = _mussels(load_all_recipes=all)
 
     my_mussels.list_tools(verbose)
 
@@ -349,9 +517,9 @@ def tool_show(tool: str, version: str, verbose: bool, all: bool):
     """
     Show details about a specific tool.
     """
-    my_mussels = Mussels(load_all_recipes=all)
+    my_mussels = _mussels(load_all_recipes=all)
 
-    my_mussels.show_tool(tool, version, verbose)
+    my_mussels.show_tool(tool, version, verbose, all)
 
 
 @tool.command("clone")
@@ -367,7 +535,7 @@ def tool_clone(tool: str, version: str, cookbook: str, dest: str):
     """
     Copy a tool to the current directory or to a specific directory.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True)
 
     my_mussels.clone_tool(tool, version, cookbook, dest)
 
@@ -388,7 +556,7 @@ def tool_check(tool: str, version: str, cookbook: str):
     Check if a tool is installed.
     """
 
-    my_mussels = Mussels()
+    my_mussels = _mussels()
 
     results = []
 
@@ -409,7 +577,7 @@ def clean_cache():
     """
     Clear the cache files.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True, load_cookbooks=False)
 
     my_mussels.clean_cache()
 
@@ -419,7 +587,7 @@ def clean_install():
     """
     Clear the install files.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True, load_cookbooks=False)
 
     my_mussels.clean_install()
 
@@ -429,7 +597,7 @@ def clean_logs():
     """
     Clear the logs files.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True, load_cookbooks=False)
 
     my_mussels.clean_logs()
 
@@ -439,7 +607,7 @@ def clean_all():
     """
     Clear the all files.
     """
-    my_mussels = Mussels(load_all_recipes=True)
+    my_mussels = _mussels(load_all_recipes=True, load_cookbooks=False)
 
     my_mussels.clean_all()
 
@@ -447,117 +615,13 @@ def clean_all():
 #
 # Command Aliases
 #
-@cli.command("build")
-@click.argument("recipe", required=True)
-@click.option(
-    "--version",
-    "-v",
-    default="",
-    help="Version of recipe to build. May not be combined with @version in recipe name. [optional]",
-)
-@click.option(
-    "--cookbook", "-c", default="", help="Specific cookbook to use. [optional]"
-)
-@click.option("--target", "-t", default="", help="Target architecture. [optional]")
-@click.option(
-    "--dry-run",
-    "-d",
-    is_flag=True,
-    help="Print out the version dependency graph without actually doing a build. [optional]",
-)
-@click.option(
-    "--rebuild",
-    "-r",
-    is_flag=True,
-    help="Re-build a recipe, even if already built. [optional]",
-)
-@click.option(
-    "--install", "-i", default="", help="Install directory. [optional] Default is: ~/.mussels/install/<target>"
-)
-@click.option(
-    "--work-dir", "-w", default="", help="Work directory. [optional] Default is: ~/.mussels/cache/work"
-)
-@click.option(
-    "--log-dir", "-l", default="", help="Log directory. [optional] Default is: ~/.mussels/logs"
-)
-@click.option(
-    "--download-dir", "-D", default="", help="Downloads directory. [optional] Default is: ~/.mussels/cache/downloads"
-)
-@click.pass_context
-def build_alias(
-    ctx,
-    recipe: str,
-    version: str,
-    cookbook: str,
-    target: str,
-    dry_run: bool,
-    rebuild: bool,
-    install: str,
-    work_dir: str,
-    log_dir: str,
-    download_dir: str,
-):
-    """
-    Download, extract, build, and install a recipe.
-
-    This is just an alias for `recipe build`.
-    """
-    ctx.forward(recipe_build)
-
-
-@cli.command("list")
-@click.pass_context
-@click.option(
-    "--verbose", "-V", is_flag=True, default=False, help="Verbose output. [optional]"
-)
-@click.option(
-    "--all",
-    "-a",
-    is_flag=True,
-    default=False,
-    help="List all recipes, including those for other platforms. [optional]",
-)
-def list_alias(ctx, verbose: bool, all: bool):
-    """
-    List a list of recipes you can build on this platform.
-
-    This is just an alias for `recipe list`.
-    """
-    ctx.forward(recipe_list)
-
-
-@cli.command("show")
-@click.pass_context
-@click.argument("recipe", required=True)
-@click.option("--version", "-v", default="", help="Version. [optional]")
-@click.option(
-    "--verbose", "-V", is_flag=True, default=False, help="Verbose output. [optional]"
-)
-@click.option(
-    "--all",
-    "-a",
-    is_flag=True,
-    default=False,
-    help="Show all recipe variants, including those for other platforms. [optional]",
-)
-def show_alias(ctx, recipe: str, version: str, verbose: bool, all: bool):
-    """
-    Show details about a specific recipe.
-
-    This is just an alias for `recipe show`.
-    """
-    ctx.forward(recipe_show)
-
-
-@cli.command("update")
-@click.pass_context
-def update_alias(ctx):
-    """
-    Update local copy of cookbooks (using Git).
-
-    This is just an alias for `recipe show`.
-    """
-    ctx.forward(cookbook_update)
+for _name, _target in {
+    "build": recipe_build,
+    "list": recipe_list,
+    "show": recipe_show,
+    "update": cookbook_update,
+}.items():
+    cli.add_command(_target, name=_name)
 
 
 if __name__ == "__main__":
@@ -16,16 +16,31 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from pathlib import Path
 
+import bisect
+import copy
 import datetime
 import fnmatch
+import hashlib
+import heapq
 import json
 import logging
+import mmap
 import os
+import pickle
 import platform
+import re
 import shutil
+import subprocess
 import sys
 import time
 from typing import *
@@ -39,9 +54,31 @@ if platform.system() == "Windows":
         os.environ["PATH"] = os.environ["PATH"] + r";C:\Program Files\Git\usr\bin"
     if not r"c:\program files\git\bin" in os.environ["PATH"].lower():
         os.environ["PATH"] = os.environ["PATH"] + r";C:\Program Files\Git\bin"
-import git
 import yaml
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    # PyYAML was built without libyaml, use the pure-Python loader.
+    from yaml import SafeLoader as _YamlLoader
+
+try:
+    import orjson
+
+    def _json_loads(data: bytes):
+        return orjson.loads(data)
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+except ImportError:
+    # orjson isn't installed, use the standard library.
+    def _json_loads(data: bytes):
+        return json.loads(data)
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, indent=2).encode("utf-8")
+
 import mussels.bookshelf
 import mussels.recipe
 import mussels.tool
@@ -57,15 +94,107 @@ from mussels.utils.versions import (
 )
 
 
+def _replace_file(src_path: str, dst_path: str):
+    """
+    Copy a file into place, replacing rather than writing through any existing file.
+
+    Files are copied rather than linked between the install directory and the build cache,
+    so that changing an installed file can never change a cached build, or the reverse.
+    """
+    if os.path.lexists(dst_path):
+        os.remove(dst_path)
+
+    shutil.copy2(src_path, dst_path)
+
+
+def _remove_dir(path: str) -> bool:
+    """
+    Remove a directory tree.
+
+    Removal is attempted directly rather than checking for the directory first,
+    sparing a stat of the directory.
+
+    Returns:    True if the directory was removed, False if it didn't exist.
+    """
+    try:
+        shutil.rmtree(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _compile_glob(*patterns: str):
+    """
+    Compile shell-style wildcard patterns, so they can be matched against many names.
+    Matches the same names as `fnmatch.fnmatch()`, which is case-insensitive on Windows.
+    Multiple patterns are compiled into one alternation, matching names that match any of them.
+    """
+    flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0
+    if len(patterns) == 1:
+        return re.compile(fnmatch.translate(patterns[0]), flags)
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns), flags)
+
+
+def _match_versions(sorted_items: dict, name_match: str, version_match: str) -> Iterator[tuple]:
+    """
+    Find the versions of the first recipe or tool matching a name pattern.
+
+    If a version pattern is given, only the first matching version of the first name
+    with a matching version is found. Otherwise every version of the first matching name is found.
+
+    Yields: (name, version) tuples, where version is an item from the sorted_items list.
+    """
+    name_re = _compile_glob(name_match)
+    version_re = _compile_glob(version_match) if version_match != "" else None
+
+    for name, versions in sorted_items.items():
+        if not name_re.match(name):
+            continue
+
+        if version_re is None:
+            for version in versions:
+                yield name, version
+            return
+
+        for version in versions:
+            if version_re.match(version["version"]):
+                yield name, version
+                return
+
+
+def _run_git(*args: str) -> str:
+    """
+    Run a git command.
+
+    Raises an exception with git's error output if it fails, or if git isn't installed.
+
+    Returns:    git's output.
+    """
+    try:
+        result = subprocess.run(
+            ["git"] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+    except FileNotFoundError:
+        raise Exception("Git not found. Install Git and add it to your PATH.")
+
+    if result.returncode != 0:
+        raise Exception(f"`git {' '.join(args)}` failed:\n{result.stderr.strip()}")
+
+    return result.stdout.strip()
+
+
 class Mussels:
-    config: dict = {}
-    cookbooks: defaultdict = defaultdict(dict)
+    config: dict
+    cookbooks: defaultdict
 
-    recipes: defaultdict = defaultdict(dict)
-    sorted_recipes: dict = {}
+    recipes: defaultdict
+    sorted_recipes: dict
 
-    tools: defaultdict = defaultdict(dict)
-    sorted_tools: dict = {}
+    tools: defaultdict
+    sorted_tools: dict
 
     log_level: str
 
@@ -78,6 +207,7 @@ class Mussels:
         log_dir: str = "",
         download_dir: str = "",
         log_level: str = "DEBUG",
+        load_cookbooks: bool = True,
     ) -> None:
         """
         Mussels class.
@@ -86,6 +216,9 @@ class Mussels:
             data_dir:   path where ClamAV should be installed.
             log_file:   path output log.
             log_level:  log level ("DEBUG", "INFO", "WARNING", "ERROR").
+            load_cookbooks: (optional) Read the recipes and tools of every cookbook on the bookshelf.
+                            If False, only local recipes are read. Cookbook commands only need the
+                            cookbook index recorded in the config, so they skip the rest.
         """
         if log_dir != "":
             self.log_file = os.path.join(log_dir, "mussels.log")
@@ -94,7 +227,21 @@ class Mussels:
         self.log_level = log_level
         self._init_logging(log_level)
 
+        self.config = {}
+        self.cookbooks = defaultdict(dict)
+        self._sorted_cookbook_names: list = []
+
+        self.recipes = defaultdict(dict)
+        self.sorted_recipes = {}
+
+        self.tools = defaultdict(dict)
+        self.sorted_tools = {}
+
+        self._detect_cache: dict = {}
+
         self.app_data_dir = data_dir
+        self._config_dir = os.path.join(self.app_data_dir, "config")
+        self._bookshelf_dir = os.path.join(self.app_data_dir, "cookbooks")
         if install_dir == "":
             self.install_dir = os.path.join(self.app_data_dir, "install")
             self.custom_install_dir = False
@@ -106,8 +253,11 @@ class Mussels:
         self.log_dir = "" if log_dir == "" else os.path.abspath(log_dir)
         self.download_dir = "" if download_dir == "" else os.path.abspath(download_dir)
 
+        self._config_snapshots: dict = {}
+        self._dirty_configs: dict = {}
         self._load_config("cookbooks.json", self.cookbooks)
-        self._load_recipes(all=load_all_recipes)
+        self._load_metadata_cache()
+        self._load_recipes(all=load_all_recipes, read_bookshelf=load_cookbooks)
 
     def _init_logging(self, level="DEBUG"):
         """
@@ -131,9 +281,21 @@ class Mussels:
             datefmt="%m/%d/%Y %I:%M:%S %p",
         )
 
-        if not os.path.exists(os.path.split(self.log_file)[0]):
-            os.makedirs(os.path.split(self.log_file)[0])
-        self.filehandler = logging.FileHandler(filename=self.log_file)
+        # The logger is shared by every instance in the process, and by worker processes
+        # forked from it. Re-use its handler for this log file rather than adding another,
+        # or each message would be written to the file once per handler.
+        log_path = os.path.abspath(self.log_file)
+        for handler in self.logger.handlers:
+            if isinstance(handler, logging.FileHandler) and handler.baseFilename == log_path:
+                self.filehandler = handler
+                self.filehandler.setLevel(levels[level])
+                return
+
+        log_dir = os.path.dirname(self.log_file)
+        if log_dir != "":
+            os.makedirs(log_dir, exist_ok=True)
+        # Don't open the log file until something is logged to it.
+        self.filehandler = logging.FileHandler(filename=self.log_file, delay=True)
         self.filehandler.setLevel(levels[level])
         self.filehandler.setFormatter(formatter)
 
@@ -146,9 +308,11 @@ class Mussels:
         # load config, if exists.
         try:
             with open(
-                os.path.join(self.app_data_dir, "config", filename), "r"
+                os.path.join(self._config_dir, filename), "rb"
             ) as config_file:
-                config.update(json.load(config_file))
+                data = config_file.read()
+            config.update(_json_loads(data))
+            self._config_snapshots[filename] = hashlib.sha256(data).digest()
         except Exception:
             # No existing config to load, that's probaby ok, but return false to indicate the failure.
             return False
@@ -159,24 +323,273 @@ class Mussels:
         """
         Update the cache.
         """
+        # Only a digest of the last stored contents is kept, not a second copy of the config.
+        data = _json_dumps(config)
+        digest = hashlib.sha256(data).digest()
+        if digest == self._config_snapshots.get(filename):
+            # Nothing changed since the config was loaded or last stored.
+            self._dirty_configs.pop(filename, None)
+            return True
+
         try:
-            if not os.path.isdir(os.path.join(self.app_data_dir, "config")):
-                os.makedirs(os.path.join(self.app_data_dir, "config"))
+            os.makedirs(self._config_dir, exist_ok=True)
         except Exception as exc:
             self.logger.warning(f"Failed to create config directory.  Exception: {exc}")
             return False
 
+        # Write to a temp file and swap it in so a crash can't leave a truncated config.
+        config_path = os.path.join(self._config_dir, filename)
+        tmp_path = f"{config_path}.{os.getpid()}.tmp"
         try:
-            with open(
-                os.path.join(self.app_data_dir, "config", filename), "w"
-            ) as config_file:
-                json.dump(config, config_file, indent=4)
+            with open(tmp_path, "wb") as config_file:
+                config_file.write(data)
+            os.replace(tmp_path, config_path)
         except Exception as exc:
             self.logger.warning(f"Failed to update config.  Exception: {exc}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
             return False
 
+        self._config_snapshots[filename] = digest
+        self._dirty_configs.pop(filename, None)
         return True
 
+    def _update_config(self, filename, config, defer_store: bool = False) -> bool:
+        """
+        Store a changed config now, or remember to store it on the next `flush_config()`.
+        """
+        if defer_store:
+            self._dirty_configs[filename] = config
+            return True
+
+        return self._store_config(filename, config)
+
+    def flush_config(self) -> bool:
+        """
+        Store every config changed with `defer_store=True` since the last flush.
+        """
+        success = True
+        for filename, config in list(self._dirty_configs.items()):
+            if not self._store_config(filename, config):
+                success = False
+
+        return success
+
+    def _load_metadata_cache(self) -> bool:
+        """
+        Prepare the cache of previously parsed recipe and tool YAML files.
+
+        The cache is partitioned by cookbook, and each partition maps a file path to its
+        (mtime, size) fingerprint and its parsed contents. Partitions are loaded as each
+        cookbook is read, so updating or reading one cookbook doesn't rewrite the others.
+
+        Each partition also records the modification time of every directory searched in the
+        cookbook. If none of those directories and none of the files have changed since, no file
+        was added, removed, or edited, and the cookbook doesn't need to be searched again.
+        """
+        self._metadata_cache_dir = os.path.join(self.app_data_dir, "cache", "metadata")
+        self._metadata_cache: dict = {}
+        self._metadata_seen: dict = {}
+        self._directory_cache: dict = {}
+        self._directory_seen: dict = {}
+
+        return True
+
+    def _load_metadata_partition(self, cookbook: str, load_path: str) -> str:
+        """
+        Load the metadata cache partition for a cookbook, and start tracking the files seen in it.
+
+        Returns:    The partition name.
+        """
+        if cookbook == "local":
+            # Local recipes depend on the current directory, so give each directory its own partition.
+            digest = hashlib.sha256(load_path.encode("utf-8")).hexdigest()
+            partition = f"local-{digest[:16]}"
+        else:
+            partition = cookbook
+
+        if partition not in self._metadata_cache:
+            try:
+                cached = self._load_pickle(
+                    os.path.join(self._metadata_cache_dir, f"{partition}.pickle")
+                )
+                self._metadata_cache[partition] = cached["files"]
+                self._directory_cache[partition] = cached.get("directories", {})
+            except Exception:
+                # No existing cache to load, or it's unreadable. We'll just parse everything.
+                self._metadata_cache[partition] = {}
+                self._directory_cache[partition] = {}
+
+        self._metadata_seen[partition] = {}
+        self._directory_seen[partition] = {}
+        return partition
+
+    def _unchanged_since_search(self, partition: str) -> bool:
+        """
+        Check if a cookbook's cached search results are still valid.
+
+        Adding, removing, or renaming a file changes the modification time of its directory,
+        and editing a file changes its own, so every directory searched and every file found
+        last time is checked.
+        """
+        directories = self._directory_cache[partition]
+        if not directories:
+            return False
+
+        try:
+            for dirpath, mtime in directories.items():
+                if os.stat(dirpath).st_mtime_ns != mtime:
+                    return False
+
+            for fpath, entry in self._metadata_cache[partition].items():
+                stat = os.stat(fpath)
+                if (stat.st_mtime_ns, stat.st_size) != entry[0]:
+                    return False
+        except OSError:
+            return False
+
+        return True
+
+    def _store_metadata_cache(self) -> bool:
+        """
+        Store the parsed YAML files seen in each cookbook read so far, if anything changed
+        since the cache was loaded.
+
+        Entries for files that no longer exist are dropped.
+        """
+        success = True
+        for partition, seen in self._metadata_seen.items():
+            directories = self._directory_seen.get(partition, {})
+            if (
+                seen == self._metadata_cache.get(partition)
+                and directories == self._directory_cache.get(partition)
+            ):
+                continue
+
+            if not self._store_pickle(
+                os.path.join(self._metadata_cache_dir, f"{partition}.pickle"),
+                {"directories": directories, "files": seen},
+            ):
+                success = False
+                continue
+
+            self._metadata_cache[partition] = dict(seen)
+            self._directory_cache[partition] = dict(directories)
+
+        return success
+
+    def _metadata_hash(self) -> str:
+        """
+        Identify the set of recipe & tool files loaded so far by their paths and fingerprints.
+        """
+        manifest = json.dumps(
+            sorted(
+                (path, entry[0])
+                for seen in self._metadata_seen.values()
+                for path, entry in seen.items()
+            )
+        )
+        return hashlib.sha256(manifest.encode("utf-8")).hexdigest()
+
+    def _load_pickle(self, path: str) -> Any:
+        """
+        Unpickle an object from a cache file.
+
+        The file is memory-mapped and unpickled in one pass, rather than through
+        the many small reads pickle.load() makes on a file object.
+        """
+        with open(path, "rb") as cache_file:
+            with mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return pickle.loads(buf)
+
+    def _store_pickle(self, path: str, obj: Any) -> bool:
+        """
+        Pickle an object to a cache file.
+        """
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # Write to a temp file and swap it in so a crash can't leave a truncated cache.
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as cache_file:
+                pickle.dump(obj, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as exc:
+            self.logger.debug(f"Failed to update cache {path}.  Exception: {exc}")
+            return False
+
+        return True
+
+    def _read_yaml(self, fpath: str, partition: str) -> Any:
+        """
+        Parse a YAML file, re-using the cached result if the file hasn't changed.
+
+        Files that fail to parse are remembered too, with the error, so that they are
+        still checked for changes and the error is reported again until they're fixed.
+        """
+        stat = os.stat(fpath)
+        fingerprint = (stat.st_mtime_ns, stat.st_size)
+
+        cached = self._metadata_cache[partition].get(fpath)
+        if cached is not None and cached[0] == fingerprint:
+            self._metadata_seen[partition][fpath] = cached
+            if len(cached) > 2:
+                raise Exception(cached[2])
+            return cached[1]
+
+        try:
+            with open(fpath, "r") as fd:
+                yaml_file = yaml.load(fd, Loader=_YamlLoader)
+        except Exception as exc:
+            self._metadata_seen[partition][fpath] = (fingerprint, None, str(exc))
+            raise
+
+        self._metadata_seen[partition][fpath] = (fingerprint, yaml_file)
+        return yaml_file
+
+    def _find_yaml_files(self, load_path: str, partition: str) -> Iterator[tuple]:
+        """
+        Search a directory for YAML files and parse each one.
+
+        Yields: (file path, parsed YAML) tuples.
+        """
+        # Walk depth-first in the same order as os.walk(), but with os.scandir() directly so
+        # each entry's type comes from the directory listing, and skip the Git metadata.
+        directories = self._directory_seen[partition]
+        pending = [os.path.abspath(load_path)]
+        while pending:
+            dirpath = pending.pop()
+            try:
+                # Stat before listing, so a change made while listing is seen next time.
+                mtime = os.stat(dirpath).st_mtime_ns
+                with os.scandir(dirpath) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            directories[dirpath] = mtime
+
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir():
+                    # Like os.walk(), don't follow symlinks to directories.
+                    if entry.name != ".git" and not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                if not entry.name.endswith(".yaml"):
+                    continue
+                fpath = entry.path
+                try:
+                    yaml_file = self._read_yaml(fpath, partition)
+                except Exception as exc:
+                    self.logger.warning(f"Failed to load YAML file: {fpath}")
+                    self.logger.warning(f"Exception occured: \n{exc}")
+                    continue
+                yield fpath, yaml_file
+
+            pending.extend(reversed(subdirs))
+
     def load_directory(self, cookbook: str, load_path: str) -> tuple:
         """
         Load all recipes and tools in a directory.
@@ -190,153 +603,170 @@ class Mussels:
         if not os.path.exists(load_path):
             return recipes, tools
 
-        for root, dirs, filenames in os.walk(load_path):
-            for fname in filenames:
-                if not fname.endswith(".yaml"):
+        partition = self._load_metadata_partition(cookbook, load_path)
+
+        if self._unchanged_since_search(partition):
+            # The files found last time are still there, unchanged.
+            self._metadata_seen[partition] = dict(self._metadata_cache[partition])
+            self._directory_seen[partition] = dict(self._directory_cache[partition])
+            yaml_files = []
+            for fpath, entry in self._metadata_seen[partition].items():
+                if len(entry) > 2:
+                    self.logger.warning(f"Failed to load YAML file: {fpath}")
+                    self.logger.warning(f"Exception occured: \n{entry[2]}")
                     continue
-                fpath = os.path.abspath(os.path.join(root, fname))
-                with open(fpath, "r") as fd:
-                    try:
-                        yaml_file = yaml.load(fd.read(), Loader=yaml.SafeLoader)
-                    except Exception as exc:
-                        self.logger.warning(f"Failed to load YAML file: {fpath}")
-                        self.logger.warning(f"Exception occured: \n{exc}")
+                yaml_files.append((fpath, entry[1]))
+        else:
+            yaml_files = self._find_yaml_files(load_path, partition)
+
+        for fpath, yaml_file in yaml_files:
+            if yaml_file == None:
+                continue
+
+            if (
+                "mussels_version" in yaml_file
+                and yaml_file["mussels_version"] >= minimum_version
+            ):
+                if not "type" in yaml_file:
+                    self.logger.warning(f"Failed to load recipe: {fpath}")
+                    self.logger.warning(f"Missing required 'type' field.")
+                    continue
+
+                if (
+                    yaml_file["type"] == "recipe"
+                    or yaml_file["type"] == "collection"
+                ):
+                    if not "name" in yaml_file:
+                        self.logger.warning(f"Failed to load recipe: {fpath}")
+                        self.logger.warning(f"Missing required 'name' field.")
                         continue
-                    if yaml_file == None:
+                    name = f"{cookbook}__{yaml_file['name']}"
+
+                    if not "version" in yaml_file:
+                        self.logger.warning(f"Failed to load recipe: {fpath}")
+                        self.logger.warning(
+                            f"Missing required 'version' field."
+                        )
                         continue
+                    else:
+                        name = f"{name}_{yaml_file['version']}"
 
-                    if (
-                        "mussels_version" in yaml_file
-                        and yaml_file["mussels_version"] >= minimum_version
-                    ):
-                        if not "type" in yaml_file:
-                            self.logger.warning(f"Failed to load recipe: {fpath}")
-                            self.logger.warning(f"Missing required 'type' field.")
-                            continue
+                    recipe_class = type(
+                        name,
+                        (mussels.recipe.BaseRecipe,),
+                        {"__doc__": f"{yaml_file['name']} recipe class."},
+                    )
 
-                        if (
-                            yaml_file["type"] == "recipe"
-                            or yaml_file["type"] == "collection"
-                        ):
-                            if not "name" in yaml_file:
-                                self.logger.warning(f"Failed to load recipe: {fpath}")
-                                self.logger.warning(f"Missing required 'name' field.")
-                                continue
-                            name = f"{cookbook}__{yaml_file['name']}"
-
-                            if not "version" in yaml_file:
-                                self.logger.warning(f"Failed to load recipe: {fpath}")
-                                self.logger.warning(
-                                    f"Missing required 'version' field."
-                                )
-                                continue
-                            else:
-                                name = f"{name}_{yaml_file['version']}"
-
-                            recipe_class = type(
-                                name,
-                                (mussels.recipe.BaseRecipe,),
-                                {"__doc__": f"{yaml_file['name']} recipe class."},
+                    recipe_class.module_file = fpath
+
+                    recipe_class.name = yaml_file["name"]
+
+                    recipe_class.version = yaml_file["version"]
+
+                    if yaml_file["type"] == "collection":
+                        recipe_class.is_collection = True
+                    else:
+                        recipe_class.is_collection = False
+
+                        if not "url" in yaml_file:
+                            self.logger.warning(
+                                f"Failed to load recipe: {fpath}"
                             )
+                            self.logger.warning(
+                                f"Missing required 'url' field."
+                            )
+                            continue
+                        else:
+                            recipe_class.url = yaml_file["url"]
 
-                            recipe_class.module_file = fpath
+                    if "sha256" in yaml_file:
+                        recipe_class.sha256 = str(yaml_file["sha256"]).lower()
 
-                            recipe_class.name = yaml_file["name"]
+                    if "archive_name_change" in yaml_file:
+                        recipe_class.archive_name_change = (
+                            yaml_file["archive_name_change"][0],
+                            yaml_file["archive_name_change"][1],
+                        )
 
-                            recipe_class.version = yaml_file["version"]
+                    if not "platforms" in yaml_file:
+                        self.logger.warning(f"Failed to load recipe: {fpath}")
+                        self.logger.warning(
+                            f"Missing required 'platforms' field."
+                        )
+                        continue
+                    else:
+                        recipe_class.platforms = yaml_file["platforms"]
 
-                            if yaml_file["type"] == "collection":
-                                recipe_class.is_collection = True
-                            else:
-                                recipe_class.is_collection = False
+                    recipes[recipe_class.name][
+                        recipe_class.version
+                    ] = recipe_class
 
-                                if not "url" in yaml_file:
-                                    self.logger.warning(
-                                        f"Failed to load recipe: {fpath}"
-                                    )
-                                    self.logger.warning(
-                                        f"Missing required 'url' field."
-                                    )
-                                    continue
-                                else:
-                                    recipe_class.url = yaml_file["url"]
+                elif yaml_file["type"] == "tool":
+                    if not "name" in yaml_file:
+                        self.logger.warning(f"Failed to load tool: {fpath}")
+                        self.logger.warning(f"Missing required 'name' field.")
+                        continue
+                    name = f"{cookbook}__{yaml_file['name']}"
 
-                            if "archive_name_change" in yaml_file:
-                                recipe_class.archive_name_change = (
-                                    yaml_file["archive_name_change"][0],
-                                    yaml_file["archive_name_change"][1],
-                                )
+                    if "version" in yaml_file:
+                        name = f"{name}_{yaml_file['version']}"
 
-                            if not "platforms" in yaml_file:
-                                self.logger.warning(f"Failed to load recipe: {fpath}")
-                                self.logger.warning(
-                                    f"Missing required 'platforms' field."
-                                )
-                                continue
-                            else:
-                                recipe_class.platforms = yaml_file["platforms"]
-
-                            recipes[recipe_class.name][
-                                recipe_class.version
-                            ] = recipe_class
-
-                        elif yaml_file["type"] == "tool":
-                            if not "name" in yaml_file:
-                                self.logger.warning(f"Failed to load tool: {fpath}")
-                                self.logger.warning(f"Missing required 'name' field.")
-                                continue
-                            name = f"{cookbook}__{yaml_file['name']}"
-
-                            if "version" in yaml_file:
-                                name = f"{name}_{yaml_file['version']}"
-
-                            tool_class = type(
-                                name,
-                                (mussels.tool.BaseTool,),
-                                {"__doc__": f"{yaml_file['name']} tool class."},
-                            )
+                    tool_class = type(
+                        name,
+                        (mussels.tool.BaseTool,),
+                        {"__doc__": f"{yaml_file['name']} tool class."},
+                    )
 
-                            tool_class.module_file = fpath
+                    tool_class.module_file = fpath
 
-                            tool_class.name = yaml_file["name"]
+                    tool_class.name = yaml_file["name"]
 
-                            if "version" in yaml_file:
-                                tool_class.version = yaml_file["version"]
+                    if "version" in yaml_file:
+                        tool_class.version = yaml_file["version"]
 
-                            if not "platforms" in yaml_file:
-                                self.logger.warning(f"Failed to load tool: {fpath}")
-                                self.logger.warning(
-                                    f"Missing required 'platforms' field."
-                                )
-                                continue
-                            else:
-                                tool_class.platforms = yaml_file["platforms"]
+                    if not "platforms" in yaml_file:
+                        self.logger.warning(f"Failed to load tool: {fpath}")
+                        self.logger.warning(
+                            f"Missing required 'platforms' field."
+                        )
+                        continue
+                    else:
+                        tool_class.platforms = yaml_file["platforms"]
 
-                            tools[tool_class.name][tool_class.version] = tool_class
+                    tools[tool_class.name][tool_class.version] = tool_class
 
         return recipes, tools
 
-    def _read_cookbook(self, cookbook: str, cookbook_path: str) -> bool:
+    def _read_cookbook(
+        self, cookbook: str, cookbook_path: str, loaded: Optional[tuple] = None
+    ) -> bool:
         """
         Load the recipes and tools from a single cookbook.
+
+        Args:
+            cookbook:       The cookbook name.
+            cookbook_path:  The cookbook directory.
+            loaded:         (optional) The (recipes, tools) tuple already loaded from the directory.
         """
 
         sorted_recipes: defaultdict = defaultdict(list)
         sorted_tools: defaultdict = defaultdict(list)
 
         # Load the recipes and the tools
-        recipes, tools = self.load_directory(
-            cookbook=cookbook, load_path=os.path.join(cookbook_path)
-        )
+        if loaded is None:
+            loaded = self.load_directory(
+                cookbook=cookbook, load_path=cookbook_path
+            )
+        recipes, tools = loaded
 
         # Sort the recipes
         sorted_recipes = sort_cookbook_by_version(recipes)
 
         if len(sorted_recipes) > 0:
             self.cookbooks[cookbook]["recipes"] = sorted_recipes
-            for recipe in recipes.keys():
+            for recipe in recipes:
                 for version in recipes[recipe]:
-                    if version not in self.recipes[recipe].keys():
+                    if version not in self.recipes[recipe]:
                         self.recipes[recipe][version] = {}
                     self.recipes[recipe][version][cookbook] = recipes[recipe][version]
 
@@ -345,9 +775,9 @@ class Mussels:
 
         if len(sorted_tools) > 0:
             self.cookbooks[cookbook]["tools"] = sorted_tools
-            for tool in tools.keys():
+            for tool in tools:
                 for version in tools[tool]:
-                    if version not in self.tools[tool].keys():
+                    if version not in self.tools[tool]:
                         self.tools[tool][version] = {}
                     self.tools[tool][version][cookbook] = tools[tool][version]
 
@@ -359,21 +789,49 @@ class Mussels:
 
         return True
 
+    def _read_cookbooks(self, books: list) -> dict:
+        """
+        Load the recipes and tools from several cookbooks.
+
+        Each cookbook directory is loaded in its own thread, unless MUSSELS_NO_PARALLEL_LOAD is set.
+        The results are merged into the shared state one cookbook at a time.
+
+        Args:
+            books:  A list of (cookbook name, cookbook path) tuples.
+
+        Returns:    A dictionary mapping each cookbook name to True if any recipes or tools were read.
+        """
+        if len(books) > 1 and not os.environ.get("MUSSELS_NO_PARALLEL_LOAD"):
+            max_workers = min(8, (os.cpu_count() or 1) * 4, len(books))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                loaded = list(
+                    executor.map(
+                        lambda book: self.load_directory(cookbook=book[0], load_path=book[1]),
+                        books,
+                    )
+                )
+        else:
+            loaded = [None] * len(books)
+
+        return {
+            cookbook: self._read_cookbook(cookbook, cookbook_path, book_loaded)
+            for (cookbook, cookbook_path), book_loaded in zip(books, loaded)
+        }
+
     def _read_bookshelf(self) -> bool:
         """
         Load the recipes and tools from cookbooks in ~/.mussels/cookbooks
         """
-        bookshelf = os.path.join(self.app_data_dir, "cookbooks")
+        bookshelf = self._bookshelf_dir
         if os.path.isdir(bookshelf):
-            for cookbook in os.listdir(bookshelf):
-                cookbook_path = os.path.join(
-                    os.path.join(self.app_data_dir, "cookbooks"), cookbook
-                )
-                if os.path.isdir(cookbook_path):
-                    if not self._read_cookbook(cookbook, cookbook_path):
-                        self.logger.warning(
-                            f"Failed to read any recipes or tools from cookbook: {cookbook}"
-                        )
+            with os.scandir(bookshelf) as entries:
+                books = [(entry.name, entry.path) for entry in entries if entry.is_dir()]
+
+            for cookbook, success in self._read_cookbooks(books).items():
+                if not success:
+                    self.logger.warning(
+                        f"Failed to read any recipes or tools from cookbook: {cookbook}"
+                    )
 
             self._store_config("cookbooks.json", self.cookbooks)
 
@@ -384,7 +842,7 @@ class Mussels:
         Load the recipes and tools from local "mussels" directory
         """
         # Load recipes and tools from `cwd` directory, if any exist.
-        local_recipes = os.path.join(os.getcwd())
+        local_recipes = os.getcwd()
         if os.path.isdir(local_recipes):
             if not self._read_cookbook("local", local_recipes):
                 return False
@@ -447,18 +905,24 @@ class Mussels:
 
         return sorted_items
 
-    def _load_recipes(self, all: bool = False) -> bool:
+    def _load_recipes(self, all: bool = False, read_bookshelf: bool = True) -> bool:
         """
         Load the recipes and tools.
         """
         # If the cache is empty, try reading from the local bookshelf.
-        if len(self.recipes) == 0 or len(self.tools) == 0:
+        if read_bookshelf and (len(self.recipes) == 0 or len(self.tools) == 0):
             self._read_bookshelf()
 
         # Load recipes from the local mussels directory, if those exists.
         if not self._read_local_recipes() and "local" in self.cookbooks:
             self.cookbooks.pop("local")
 
+        self._sorted_cookbook_names = sorted(self.cookbooks)
+
+        self._store_metadata_cache()
+
+        self._build_indexes()
+
         if len(self.recipes) == 0:
             return False
 
@@ -472,6 +936,65 @@ class Mussels:
 
         return True
 
+    def _build_indexes(self):
+        """
+        Index the recipe and tool classes by NVC, so lookups take one hash instead of three.
+
+        Must be called again whenever cookbooks are re-read.
+        """
+        self._recipe_flat = {
+            NVC(recipe, version, cookbook): recipe_class
+            for recipe, versions in self.recipes.items()
+            for version, cookbooks in versions.items()
+            for cookbook, recipe_class in cookbooks.items()
+        }
+        self._tool_flat = {
+            NVC(tool, version, cookbook): tool_class
+            for tool, versions in self.tools.items()
+            for version, cookbooks in versions.items()
+            for cookbook, tool_class in cookbooks.items()
+        }
+        self._variant_index: dict = {}
+
+        # Which cookbooks provide each recipe and tool, including those that are hidden by default.
+        self._recipe_providers: defaultdict = defaultdict(list)
+        self._tool_providers: defaultdict = defaultdict(list)
+        for cookbook, book in self.cookbooks.items():
+            for recipe, versions in book.get("recipes", {}).items():
+                self._recipe_providers[recipe].append((cookbook, versions))
+            for tool, versions in book.get("tools", {}).items():
+                self._tool_providers[tool].append((cookbook, versions))
+
+    def _log_providers(self, providers: dict, name: str):
+        """
+        Explain which known cookbooks provide a recipe or tool that couldn't be found,
+        e.g. because the cookbooks aren't trusted, or don't support the current platform.
+        """
+        if name not in providers:
+            return
+
+        self.logger.info(f"{name} is provided by:")
+        for cookbook, versions in providers[name]:
+            trusted = "trusted" if self.cookbooks[cookbook].get("trusted", False) else "untrusted"
+            self.logger.info(f"    {cookbook} ({trusted}): {', '.join(versions)}")
+
+    def _recipe_variant(self, recipe_nvc: NVC, platform: str, target: str) -> tuple:
+        """
+        Get the build options (dependencies, required tools, etc) of a recipe
+        for the platform variant best matching a platform, and a target.
+
+        Returns:    A tuple of (matching platform, target options).
+        """
+        key = (recipe_nvc, platform, target)
+        if key not in self._variant_index:
+            recipe_class = self._recipe_flat[recipe_nvc]
+            matching_platform = pick_platform(platform, recipe_class.platforms.keys())
+            self._variant_index[key] = (
+                matching_platform,
+                recipe_class.platforms[matching_platform][target],
+            )
+        return self._variant_index[key]
+
     def _build_recipe(
         self,
         recipe: str,
@@ -481,6 +1004,7 @@ class Mussels:
         target: str,
         toolchain: dict,
         rebuild: bool = False,
+        cas_key: str = "",
     ) -> dict:
         """
         Build a specific recipe.
@@ -488,6 +1012,8 @@ class Mussels:
         Args:
             recipe:     The recipe name with no version information.
             version:    The recipe version.
+            cas_key:    (optional) Build cache key. If set, install a cached build
+                        instead of building, and cache the result of the build.
 
         Returns:    A dictionary of build results
         """
@@ -531,24 +1057,29 @@ class Mussels:
         if version == "":
             # Use the default (highest) version
             try:
-                version = self.sorted_recipes[recipe][0]
+                version = self.sorted_recipes[recipe][0]["version"]
             except KeyError:
                 self.logger.error(f"FAILED to find recipe: {recipe}!")
                 result["time elapsed"] = time.time() - start
                 return result
 
         try:
-            recipe_class = self.recipes[recipe][version][cookbook]
+            recipe_class = self._recipe_flat[NVC(recipe, version, cookbook)]
         except KeyError:
             self.logger.error(f"FAILED to find recipe: {nvc_str(recipe, version)}!")
             result["time elapsed"] = time.time() - start
             return result
 
-        # If the user specified a custom install directory, then don't add the target arch subdirectory.
-        if self.custom_install_dir == True:
-            install_dir = self.install_dir
-        else:
-            install_dir = os.path.join(self.install_dir, target)
+        install_dir = self._target_install_dir(target)
+
+        if cas_key != "" and not rebuild and self._cas_restore(cas_key, install_dir):
+            self.logger.info(
+                f"Success: {nvc_str(recipe, version)} installed from the build cache. :)\n"
+            )
+            result["success"] = True
+            result["cached"] = True
+            result["time elapsed"] = time.time() - start
+            return result
 
         recipe_object = recipe_class(
             toolchain=toolchain,
@@ -570,10 +1101,161 @@ class Mussels:
             )
             result["success"] = True
 
+            if cas_key != "":
+                self._cas_store(cas_key, install_dir, recipe_object.installed_files)
+
         result["time elapsed"] = time.time() - start
 
         return result
 
+    def _target_install_dir(self, target: str) -> str:
+        """
+        Get the install directory for a build target.
+        """
+        # If the user specified a custom install directory, then don't add the target arch subdirectory.
+        if self.custom_install_dir == True:
+            return self.install_dir
+        return os.path.join(self.install_dir, target)
+
+    def _cas_keys(self, graph: dict, batches: list, target: str) -> dict:
+        """
+        Compute the build cache key of each recipe in a build graph that can be cached.
+
+        A key covers everything that goes into a build: the recipe file & patches,
+        the platform, target & install directory, the required tool versions, and
+        the keys of the recipe's dependencies.
+
+        Recipes are only cached if all of their output is copied by `install_paths`.
+        Collections, recipes with an `install` script, and recipes with any build script
+        that refers to the install directory, are never cached.
+
+        Returns:    A dictionary mapping recipe NVCs to build cache keys.
+        """
+        install_dir = self._target_install_dir(target)
+
+        keys = {}
+        cacheable = {}
+        for bundle in batches:
+            for recipe_nvc in bundle:
+                recipe_class = self._recipe_flat[recipe_nvc]
+                matching_platform, target_options = self._recipe_variant(
+                    recipe_nvc, platform.system(), target
+                )
+
+                source = hashlib.sha256()
+                if recipe_class.module_file != "":
+                    with open(recipe_class.module_file, "rb") as recipe_file:
+                        source.update(recipe_file.read())
+
+                if "patches" in target_options:
+                    patch_dir = os.path.join(
+                        os.path.dirname(recipe_class.module_file),
+                        target_options["patches"],
+                    )
+                    if os.path.isdir(patch_dir):
+                        for patchfile in sorted(os.listdir(patch_dir)):
+                            source.update(patchfile.encode("utf-8"))
+                            with open(os.path.join(patch_dir, patchfile), "rb") as patch_file:
+                                source.update(patch_file.read())
+
+                tools = sorted(
+                    get_item_version(tool, self.sorted_tools)
+                    for tool in target_options.get("required_tools", [])
+                )
+
+                state = json.dumps(
+                    [
+                        source.hexdigest(),
+                        recipe_nvc,
+                        matching_platform,
+                        target,
+                        install_dir,
+                        tools,
+                        sorted(keys[dep] for dep in graph[recipe_nvc]),
+                    ]
+                )
+                keys[recipe_nvc] = hashlib.sha256(state.encode("utf-8")).hexdigest()
+
+                build_scripts = target_options.get("build_script", {})
+                if (
+                    not recipe_class.is_collection
+                    and "install_paths" in target_options
+                    and "install" not in build_scripts
+                    and not any(
+                        variable in str(script)
+                        for script in build_scripts.values()
+                        for variable in ("{install}", "{includes}", "{libs}")
+                    )
+                ):
+                    cacheable[recipe_nvc] = keys[recipe_nvc]
+
+        return cacheable
+
+    def _cas_has(self, key: str) -> bool:
+        """
+        Check if the build cache has a complete entry for a build cache key.
+        """
+        entry = os.path.join(self.app_data_dir, "cache", "cas", key)
+        return os.path.exists(os.path.join(entry, ".done"))
+
+    def _cas_restore(self, key: str, install_dir: str) -> bool:
+        """
+        Install the files of a cached build, if the build cache has it.
+        """
+        if not self._cas_has(key):
+            return False
+
+        entry = os.path.join(self.app_data_dir, "cache", "cas", key)
+
+        files_dir = os.path.join(entry, "files")
+        try:
+            for root, _, files in os.walk(files_dir):
+                for name in files:
+                    src_path = os.path.join(root, name)
+                    dst_path = os.path.join(
+                        install_dir, os.path.relpath(src_path, files_dir)
+                    )
+                    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+                    _replace_file(src_path, dst_path)
+        except Exception as exc:
+            self.logger.warning(f"Failed to install from the build cache.  Exception: {exc}")
+            return False
+
+        return True
+
+    def _cas_store(self, key: str, install_dir: str, installed_files: list) -> bool:
+        """
+        Add the files installed by a build to the build cache.
+        """
+        entry = os.path.join(self.app_data_dir, "cache", "cas", key)
+
+        # Assemble the entry in a temp directory and swap it in, so a partial entry is never used.
+        tmp_entry = f"{entry}.{os.getpid()}.tmp"
+        try:
+            for path in installed_files:
+                relpath = os.path.relpath(path, install_dir)
+                if relpath.startswith(os.pardir):
+                    self.logger.debug(f"Not caching build, {path} is outside of {install_dir}.")
+                    shutil.rmtree(tmp_entry, ignore_errors=True)
+                    return False
+
+                dst_path = os.path.join(tmp_entry, "files", relpath)
+                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+                _replace_file(path, dst_path)
+
+            os.makedirs(tmp_entry, exist_ok=True)
+            with open(os.path.join(tmp_entry, ".done"), "w"):
+                pass
+
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp_entry, entry)
+        except Exception as exc:
+            self.logger.debug(f"Failed to update the build cache.  Exception: {exc}")
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            return False
+
+        return True
+
     def _get_recipe_version(self, recipe: str, platform: str, target: str) -> NVC:
         """
         Select recipe version based on version requirements.
@@ -591,11 +1273,16 @@ class Mussels:
                 "cookbook"->str,
             )
         """
+        key = (recipe, platform, target)
+        if key in self._recipe_version_cache:
+            return self._recipe_version_cache[key]
+
         # Select the recipe
         nvc = get_item_version(recipe, self.sorted_recipes, target, logger=self.logger)
+        touched = [("recipe", nvc.name)]
 
         # Use "get_item_version()" to prune the list of sorted_tools based on the required tools for the selected recipe.
-        recipe_class = self.recipes[nvc.name][nvc.version][nvc.cookbook]
+        recipe_class = self._recipe_flat[nvc]
 
         for each_platform in recipe_class.platforms:
             if platform_matches(each_platform, platform):
@@ -606,134 +1293,431 @@ class Mussels:
                     if "required_tools" in build_target.keys():
                         for tool in build_target["required_tools"]:
                             try:
-                                get_item_version(tool, self.sorted_tools, logger=self.logger)
+                                tool_nvc = get_item_version(tool, self.sorted_tools, logger=self.logger)
                             except Exception as exc:
                                 raise Exception(f"The {tool} tool, required by {nvc_str(nvc.name, nvc.version, nvc.cookbook)} is not available...\n{exc}")
+                            touched.append(("tool", tool_nvc.name))
                     break
+
+        # Selecting a version prunes the remaining candidates, which may change earlier selections.
+        # Memoized selections are only kept for as long as nothing they depend on was pruned.
+        pruned = False
+        for kind, name in touched:
+            sorted_items = self.sorted_recipes if kind == "recipe" else self.sorted_tools
+            state = tuple(
+                (item["version"], tuple(item["cookbooks"]))
+                for item in sorted_items.get(name, [])
+            )
+            if self._selection_state.get((kind, name), state) != state:
+                pruned = True
+            self._selection_state[(kind, name)] = state
+
+        if pruned:
+            self._recipe_version_cache = {}
+        self._recipe_version_cache[key] = nvc
         return nvc
 
-    def _identify_build_recipes(
-        self, recipe: str, chain: list, platform: str, target: str
-    ) -> list:
+    def _identify_build_recipes(self, recipe: str, platform: str, target: str) -> list:
         """
         Identify all recipes that must be built given a specific recipe.
 
         Args:
-            recipe:     A specific recipe to build.
-            chain:      (in,out) A dependency chain starting from the first
-                        recursive call used to identify circular dependencies.
+            recipe:     A specific recipe to build.
+
+        Returns:    The recipe strings for the recipe and all of its dependencies, each listed once.
+        """
+        recipes = []
+        visited = set()
+
+        # Depth-first, each entry carries the chain of recipe names that led to it to identify circular dependencies.
+        stack = [(recipe, (), None)]
+        while stack:
+            recipe, chain, required_by = stack.pop()
+
+            try:
+                recipe_nvc = self._get_recipe_version(recipe, platform, target)
+
+                if recipe_nvc.name in chain:
+                    raise ValueError(f"Circular dependencies found! {list(chain) + [recipe_nvc.name]}")
+            except Exception as exc:
+                if required_by is None:
+                    raise
+                raise Exception(f"The {recipe} recipe, required by {nvc_str(required_by.name, required_by.version, required_by.cookbook)} has dependency issues...\n{exc}")
+
+            if recipe in visited:
+                continue
+            visited.add(recipe)
+            recipes.append(recipe)
+
+            # TODO: if the recipe doesn't support current platform, see if next recipe does.
+            _, target_options = self._recipe_variant(recipe_nvc, platform, target)
+
+            chain = chain + (recipe_nvc.name,)
+            for dependency in reversed(target_options.get("dependencies", [])):
+                if ":" not in dependency:
+                    # If the cookbook isn't explicitly specified for the dependency,
+                    # select the recipe from the current cookbook.
+                    dependency = f"{recipe_nvc.cookbook}:{dependency}"
+
+                stack.append((dependency, chain, recipe_nvc))
+
+        return recipes
+
+    def _get_build_graph(self, recipe: str, platform: str, target: str) -> dict:
+        """
+        Resolve the dependency graph for a recipe.
+
+        Args:
+            recipe:    A recipes string in the format [cookbook:]recipe[==version].
+
+        Returns:    A dictionary mapping each recipe NVC to the set of NVCs it depends on.
+        """
+        # Selections are only valid for the sorted recipe & tool versions they were made against.
+        self._recipe_version_cache: dict = {}
+        self._selection_state: dict = {}
+
+        # Identify all recipes that must be built given list of desired builds.
+        try:
+            all_recipes = self._identify_build_recipes(recipe, platform, target)
+        except Exception as exc:
+            raise Exception(f"Failed to assemble dependency chain for {recipe} on {platform} ({target}):\n{exc}")
+
+        # Build a map of recipes (name,version) tuples to sets of dependency (name,version,cookbook) tuples
+        nvc_to_deps = {}
+        for recipe in all_recipes:
+            recipe_nvc = self._get_recipe_version(recipe, platform, target)
+            _, target_options = self._recipe_variant(recipe_nvc, platform, target)
+
+            dependencies = target_options.get("dependencies", [])
+            nvc_to_deps[recipe_nvc] = set(
+                [
+                    self._get_recipe_version(dependency, platform, target)
+                    for dependency in dependencies
+                ]
+            )
+
+        return nvc_to_deps
+
+    def _load_build_cache(self) -> bool:
+        """
+        Load the cache of resolved build graphs and recipe build times.
+        """
+        self._build_cache_path = os.path.join(self.app_data_dir, "cache", "graph.pickle")
+        self._build_cache: dict = {"graphs": {}, "build_times": {}}
+
+        try:
+            self._build_cache.update(self._load_pickle(self._build_cache_path))
+        except Exception:
+            # No existing cache to load, or it's unreadable. Graphs will be resolved from scratch.
+            return False
+
+        return True
+
+    def _build_graph_key(self, recipe: str, platform: str, target: str) -> str:
+        """
+        Identify a build graph by everything that goes into resolving it:
+        the requested recipe, the platform & target, the available recipe & tool versions,
+        and the fingerprint of every recipe & tool file.
+        """
+        state = json.dumps(
+            [
+                recipe,
+                platform,
+                target,
+                self.sorted_recipes,
+                self.sorted_tools,
+                self._metadata_hash(),
+            ],
+            sort_keys=True,
+        )
+        return hashlib.sha256(state.encode("utf-8")).hexdigest()
+
+    def _resolve_build_graph(
+        self, recipe: str, platform: str, target: str, rebuild_graph: bool = False
+    ) -> dict:
+        """
+        Get the dependency graph for a recipe, re-using a cached graph if possible.
+
+        Args:
+            recipe:         A recipes string in the format [cookbook:]recipe[==version].
+            rebuild_graph:  (optional) Ignore any cached dependency graph.
+
+        Returns:    A dictionary mapping each recipe NVC to the set of NVCs it depends on.
+        """
+        graphs = self._build_cache["graphs"]
+        key = self._build_graph_key(recipe, platform, target)
+
+        if not rebuild_graph and key in graphs:
+            self.logger.debug(f"Using cached dependency graph for {recipe}.")
+            cached = graphs.pop(key)
+            graphs[key] = cached
+
+            # Resolving the graph prunes the sorted recipe & tool versions. Restore that too.
+            self.sorted_recipes = copy.deepcopy(cached["sorted_recipes"])
+            self.sorted_tools = copy.deepcopy(cached["sorted_tools"])
+            graph = cached["graph"]
+        else:
+            graph = self._get_build_graph(recipe, platform, target)
+
+            graphs.pop(key, None)
+            graphs[key] = {
+                "graph": graph,
+                "sorted_recipes": copy.deepcopy(self.sorted_recipes),
+                "sorted_tools": copy.deepcopy(self.sorted_tools),
+            }
+            while len(graphs) > 32:
+                graphs.pop(next(iter(graphs)))
+
+        return graph
+
+    def _get_build_batches(self, graph: dict) -> list:
+        """
+        Get list of build batches that can be built concurrently.
+
+        Args:
+            graph:  A dictionary mapping each recipe NVC to the set of NVCs it depends on.
+        """
+        # Count the unbuilt dependencies of each recipe, and map each recipe to the recipes that need it.
+        indegree = {nvc: 0 for nvc in graph}
+        dependents: DefaultDict[NVC, list] = defaultdict(list)
+        for nvc, deps in graph.items():
+            for dep in deps:
+                indegree[nvc] += 1
+                dependents[dep].append(nvc)
+
+        batches = []
+
+        # Start with all recipes that have no dependencies
+        ready = deque(nvc for nvc, count in indegree.items() if count == 0)
+
+        while ready:
+            # Everything ready now can be built concurrently.
+            batch = set(ready)
+            ready.clear()
+
+            # Release the recipes that were only waiting on this batch.
+            for recipe in batch:
+                for dependent in dependents[recipe]:
+                    indegree[dependent] -= 1
+                    if indegree[dependent] == 0:
+                        ready.append(dependent)
+
+            # Add the batch to the list
+            batches.append(batch)
+
+        # Anything left over is waiting on itself, so we have a loop in the graph
+        if sum(indegree.values()) != 0:
+            msg = "Circular dependencies found!\n"
+            msg += json.dumps(
+                {
+                    nvc_str(nvc.name, nvc.version, nvc.cookbook): sorted(
+                        nvc_str(dep.name, dep.version, dep.cookbook) for dep in graph[nvc]
+                    )
+                    for nvc, count in indegree.items()
+                    if count
+                },
+                indent=4,
+            )
+            raise ValueError(msg)
+
+        # Return the list of batches
+        return batches
+
+    def _rank_build_graph(self, graph: dict, batches: list) -> tuple:
+        """
+        Compute the "upward rank" of each recipe in a build graph, for critical-path scheduling.
+
+        A recipe's rank is its expected build time plus the highest rank of any recipe that
+        depends on it. Recipes with the highest rank lie on the critical path and should be
+        started first. Expected build times come from previous builds, or 1 second if unknown.
+
+        Returns:    A tuple of (rank, dependents) dictionaries, keyed by recipe NVC.
+        """
+        build_times = self._build_cache["build_times"]
+
+        dependents: defaultdict = defaultdict(list)
+        for recipe_nvc, deps in graph.items():
+            for dep in deps:
+                dependents[dep].append(recipe_nvc)
+
+        rank: dict = {}
+        for bundle in reversed(batches):
+            for recipe_nvc in bundle:
+                rank[recipe_nvc] = build_times.get(recipe_nvc, 1.0) + max(
+                    [rank[dependent] for dependent in dependents[recipe_nvc]],
+                    default=0.0,
+                )
+
+        return rank, dependents
+
+    def _prefetch_archives(
+        self, graph: dict, cas_keys: dict, rebuild: bool = False, jobs: int = 8
+    ) -> None:
+        """
+        Download the source archives for every recipe in a build graph concurrently.
+
+        Recipes that will be installed from the build cache don't need their archives,
+        so those are skipped.
+
+        Failures are only logged here. The recipe build will try the download again
+        and report the failure itself.
+
+        Args:
+            cas_keys:   A dictionary mapping recipe NVCs to build cache keys.
+            rebuild:    (optional) The build cache won't be used, so every archive is needed.
         """
-        recipe_nvc = self._get_recipe_version(recipe, platform, target)
+        if self.download_dir != "":
+            download_dir = self.download_dir
+        else:
+            download_dir = os.path.join(
+                os.path.abspath(self.app_data_dir), "cache", "downloads"
+            )
 
-        if (len(chain) > 0) and (recipe_nvc.name == chain[0]):
-            raise ValueError(f"Circular dependencies found! {chain}")
-        chain.append(recipe_nvc.name)
+        downloads = {}
+        for recipe_nvc in graph:
+            recipe_class = self._recipe_flat[recipe_nvc]
+            # Recipes from untrusted cookbooks won't be built, so don't download them either.
+            if recipe_class.is_collection or not self.cookbooks[recipe_nvc.cookbook]["trusted"]:
+                continue
 
-        recipes = []
+            if not rebuild and recipe_nvc in cas_keys and self._cas_has(cas_keys[recipe_nvc]):
+                continue
 
-        recipes.append(recipe)
-
-        # Verify that recipe supports current platform.
-        platform_options = self.recipes[recipe_nvc.name][recipe_nvc.version][
-            recipe_nvc.cookbook
-        ].platforms.keys()
-        matching_platform = pick_platform(platform, platform_options)
-        if matching_platform == "":
-            # recipe doesn't support current platform.
-            # TODO: see if next recipe does.
-            pass
-
-        # verify that recipe supports requested target architecture
-
-        if (
-            "dependencies"
-            in self.recipes[recipe_nvc.name][recipe_nvc.version][
-                recipe_nvc.cookbook
-            ].platforms[matching_platform][target]
-        ):
-            dependencies = self.recipes[recipe_nvc.name][recipe_nvc.version][
-                recipe_nvc.cookbook
-            ].platforms[matching_platform][target]["dependencies"]
-            for dependency in dependencies:
-                if ":" not in dependency:
-                    # If the cookbook isn't explicitly specified for the dependency,
-                    # select the recipe from the current cookbook.
-                    dependency = f"{recipe_nvc.cookbook}:{dependency}"
+            download_path = os.path.join(download_dir, recipe_class.archive_name())
+            downloads[download_path] = recipe_class
+
+        if not downloads:
+            return
 
+        with ThreadPoolExecutor(max_workers=min(jobs, len(downloads))) as executor:
+            futures = {
+                executor.submit(
+                    mussels.recipe.download_archive,
+                    recipe_class.url,
+                    download_path,
+                    recipe_class.sha256,
+                    self.logger,
+                ): recipe_class
+                for download_path, recipe_class in downloads.items()
+            }
+            for future in as_completed(futures):
+                recipe_class = futures[future]
                 try:
-                    recipes += self._identify_build_recipes(
-                        dependency, chain, platform, target
-                    )
+                    future.result()
                 except Exception as exc:
-                    raise Exception(f"The {dependency} recipe, required by {nvc_str(recipe_nvc.name, recipe_nvc.version, recipe_nvc.cookbook)} has dependency issues...\n{exc}")
-
-        return recipes
+                    self.logger.debug(
+                        f"Failed to prefetch {recipe_class.url}.  Exception: {exc}"
+                    )
 
-    def _get_build_batches(self, recipe: str, platform: str, target: str) -> list:
+    def _build_parallel(
+        self,
+        graph: dict,
+        rank: dict,
+        dependents: dict,
+        target: str,
+        toolchain: dict,
+        rebuild: bool,
+        jobs: int,
+        cas_keys: dict,
+    ) -> tuple:
         """
-        Get list of build batches that can be built concurrently.
+        Build the recipes in a dependency graph using a pool of worker processes.
+
+        Whenever a worker is free, the ready recipe with the highest rank is started.
+        After a failure, no new builds are started but running builds are allowed to finish.
 
         Args:
-            recipe:    A recipes string in the format [cookbook:]recipe[==version].
-        """
-        # Identify all recipes that must be built given list of desired builds.
-        try:
-            all_recipes = set(self._identify_build_recipes(recipe, [], platform, target))
-        except Exception as exc:
-            raise Exception(f"Failed to assemble dependency chain for {recipe} on {platform} ({target}):\n{exc}")
+            toolchain:  A dictionary mapping tool names to (tool NVC, tool path) tuples.
+            cas_keys:   A dictionary mapping recipe NVCs to build cache keys.
+
+        Returns:    A tuple of (success, results), where results is a list of dictionaries
+                    describing the results of each build.
+        """
+        settings = {
+            "data_dir": self.app_data_dir,
+            "install_dir": self.install_dir if self.custom_install_dir else "",
+            "work_dir": self.work_dir,
+            "log_dir": self.log_dir,
+            "download_dir": self.download_dir,
+            "log_level": self.log_level,
+        }
 
-        # Build a map of recipes (name,version) tuples to sets of dependency (name,version,cookbook) tuples
-        nvc_to_deps = {}
-        for recipe in all_recipes:
-            recipe_nvc = self._get_recipe_version(recipe, platform, target)
-            platform_options = self.recipes[recipe_nvc.name][recipe_nvc.version][
-                recipe_nvc.cookbook
-            ].platforms.keys()
-            matching_platform = pick_platform(platform, platform_options)
+        indegree = {recipe_nvc: len(deps) for recipe_nvc, deps in graph.items()}
+        ready = [
+            (-rank[recipe_nvc], recipe_nvc)
+            for recipe_nvc, count in indegree.items()
+            if count == 0
+        ]
+        heapq.heapify(ready)
 
-            if (
-                "dependencies"
-                in self.recipes[recipe_nvc.name][recipe_nvc.version][
-                    recipe_nvc.cookbook
-                ].platforms[matching_platform][target]
-            ):
-                dependencies = self.recipes[recipe_nvc.name][recipe_nvc.version][
-                    recipe_nvc.cookbook
-                ].platforms[matching_platform][target]["dependencies"]
-            else:
-                dependencies = []
-            nvc_to_deps[recipe_nvc] = set(
-                [
-                    self._get_recipe_version(dependency, platform, target)
-                    for dependency in dependencies
-                ]
-            )
+        results = []
+        built = set()
+        failure = False
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_build_worker, initargs=(settings,)
+        ) as executor:
+            running: dict = {}
+            while ready or running:
+                while ready and not failure and len(running) < jobs:
+                    _, recipe_nvc = heapq.heappop(ready)
+
+                    matching_platform, _ = self._recipe_variant(
+                        recipe_nvc, platform.system(), target
+                    )
 
-        batches = []
+                    self.logger.info(
+                        f"Starting build of {nvc_str(recipe_nvc.name, recipe_nvc.version, recipe_nvc.cookbook)}..."
+                    )
+                    future = executor.submit(
+                        _build_recipe_worker,
+                        recipe_nvc,
+                        matching_platform,
+                        target,
+                        toolchain,
+                        rebuild,
+                        cas_keys.get(recipe_nvc, ""),
+                    )
+                    running[future] = recipe_nvc
 
-        # While there are dependencies to solve...
-        while nvc_to_deps:
+                if not running:
+                    break
 
-            # Get all recipes with no dependencies
-            ready = {recipe for recipe, deps in nvc_to_deps.items() if not deps}
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    recipe_nvc = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as exc:
+                        self.logger.error(
+                            f"FAILURE: {nvc_str(recipe_nvc.name, recipe_nvc.version)} build failed!  Exception: {exc}"
+                        )
+                        result = {
+                            "name": recipe_nvc.name,
+                            "version": recipe_nvc.version,
+                            "success": False,
+                            "time elapsed": 0.0,
+                        }
+                    results.append(result)
+                    built.add(recipe_nvc)
 
-            # If there aren't any, we have a loop in the graph
-            if not ready:
-                msg = "Circular dependencies found!\n"
-                msg += json.dumps(nvc_to_deps, indent=4)
-                raise ValueError(msg)
+                    if not result["success"]:
+                        failure = True
+                        continue
 
-            # Remove them from the dependency graph
-            for recipe in ready:
-                del nvc_to_deps[recipe]
-            for deps in nvc_to_deps.values():
-                deps.difference_update(ready)
+                    if not result.get("cached", False):
+                        self._build_cache["build_times"][recipe_nvc] = result["time elapsed"]
+                    for dependent in dependents[recipe_nvc]:
+                        indegree[dependent] -= 1
+                        if indegree[dependent] == 0:
+                            heapq.heappush(ready, (-rank[dependent], dependent))
 
-            # Add the batch to the list
-            batches.append(ready)
+        for recipe_nvc in graph:
+            if recipe_nvc not in built:
+                self.logger.warning(
+                    f"Skipping  {nvc_str(recipe_nvc.name, recipe_nvc.version, recipe_nvc.cookbook)} build due to prior failure."
+                )
 
-        # Return the list of batches
-        return batches
+        return not failure, results
 
     def _select_cookbook(
         self, recipe: str, recipe_version: dict, preferred_book: str = ""
@@ -806,7 +1790,7 @@ class Mussels:
                             if cookbook == "" or cookbook == each_cookbook:
                                 found_tool = True
 
-                                tool_class = self.tools[each_tool][each_version["version"]][each_cookbook]
+                                tool_class = self._tool_flat[NVC(each_tool, each_version["version"], each_cookbook)]
                                 tool_object = tool_class(
                                     self.app_data_dir,
                                     log_level=self.log_level,
@@ -827,16 +1811,32 @@ class Mussels:
                 f"    Unable to find tool definition matching: {nvc_str(tool, version, cookbook)}."
             )
 
+    def _detect_tool(self, tool_nvc: NVC) -> Optional[mussels.tool.BaseTool]:
+        """
+        Check if a specific tool version is installed.
+
+        Detecting a tool may run it, so the result is remembered for the life of this instance.
+
+        Returns:    The tool object if the tool was found, else None.
+        """
+        if tool_nvc not in self._detect_cache:
+            tool = self._tool_flat[tool_nvc](self.app_data_dir)
+            self._detect_cache[tool_nvc] = tool if tool.detect() else None
+
+        return self._detect_cache[tool_nvc]
+
     def build_recipe(
         self,
         recipe: str,
         version: str,
         cookbook: str,
         target: str,
-        results: list,
         dry_run: bool = False,
         rebuild: bool = False,
-    ) -> bool:
+        rebuild_graph: bool = False,
+        jobs: int = 1,
+        cas: bool = False,
+    ) -> tuple:
         """
         Execute a build of a recipe.
 
@@ -845,9 +1845,15 @@ class Mussels:
             version:    A specific version to build.  Leave empty ("") to build the newest.
             cookbook:   A specific cookbook to use.  Leave empty ("") if there's probably only one.
             target:     The target architecture to build.
-            results:    (out) A list of dictionaries describing the results of the build.
             dry_run:    (optional) Don't actually build, just print the build chain.
             rebuild:    (optional) Rebuild the entire dependency chain.
+            rebuild_graph:  (optional) Re-resolve the dependency graph, even if cached.
+            jobs:       (optional) Number of recipes to build at once.
+            cas:        (optional) Install unchanged recipes from the build cache instead of building them,
+                        and add the recipes that are built to the build cache.
+
+        Returns:    A tuple of (success, results), where results is a list of dictionaries
+                    describing the results of each build.
         """
 
         def print_results(results: list):
@@ -855,7 +1861,7 @@ class Mussels:
             Print the build results in a pretty way.
 
             Args:
-                results:    (out) A list of dictionaries describing the results of the build.
+                results:    A list of dictionaries describing the results of the build.
             """
             for result in results:
                 if result["success"]:
@@ -872,7 +1878,8 @@ class Mussels:
             self.logger.error(f"To available recipes for your platform, run:   msl list")
             self.logger.error(f"To all recipes for all platforms, run:         msl list -a")
             self.logger.error(f"To download the latest recipes, run:           msl update")
-            return False
+            self._log_providers(self._recipe_providers, recipe)
+            return False, []
 
 
         batches: List[dict] = []
@@ -887,27 +1894,40 @@ class Mussels:
             else:
                 target = "host"
 
+        self._load_build_cache()
+
         try:
-            batches = self._get_build_batches(
-                recipe_str, platform=platform.system(), target=target
+            graph = self._resolve_build_graph(
+                recipe_str,
+                platform=platform.system(),
+                target=target,
+                rebuild_graph=rebuild_graph,
             )
+            batches = self._get_build_batches(graph)
         except Exception as exc:
             self.logger.error(f"{recipe_str} build failed!")
             for line in str(exc).split('\n'):
                 self.logger.warning(f"{line}")
-            return False
+            return False, []
 
         #
         # Validate toolchain
         #
+        # Many recipes require the same tools, so only resolve each tool requirement once.
+        tool_versions: dict = {}
+
+        def get_tool_version(tool: str) -> NVC:
+            if tool not in tool_versions:
+                tool_versions[tool] = get_item_version(tool, self.sorted_tools, logger=self.logger)
+            return tool_versions[tool]
+
         # Collect set of required tools for entire build.
         toolchain = {}
+        toolchain_nvcs = {}
         preferred_tool_versions = set()
         for i, bundle in enumerate(batches):
             for j, recipe_nvc in enumerate(bundle):
-                recipe_class = self.recipes[recipe_nvc.name][recipe_nvc.version][
-                    recipe_nvc.cookbook
-                ]
+                recipe_class = self._recipe_flat[recipe_nvc]
 
                 for each_platform in recipe_class.platforms:
                     if platform_is(each_platform):
@@ -918,21 +1938,19 @@ class Mussels:
                             for tool in recipe_class.platforms[each_platform][target][
                                 "required_tools"
                             ]:
-                                tool_nvc = get_item_version(tool, self.sorted_tools, logger=self.logger)
-                                preferred_tool_versions.add(tool_nvc)
+                                preferred_tool_versions.add(get_tool_version(tool))
 
         # Check if required tools are installed
         missing_tools = []
         for tool_nvc in preferred_tool_versions:
             tool_found = False
-            preferred_tool = self.tools[tool_nvc.name][tool_nvc.version][
-                tool_nvc.cookbook
-            ](self.app_data_dir)
+            preferred_tool = self._detect_tool(tool_nvc)
 
-            if preferred_tool.detect():
+            if preferred_tool is not None:
                 # Preferred tool version is available.
                 tool_found = True
                 toolchain[tool_nvc.name] = preferred_tool
+                toolchain_nvcs[tool_nvc.name] = tool_nvc
                 self.logger.info(
                     f"    {nvc_str(tool_nvc.name, tool_nvc.version, tool_nvc.cookbook)} found."
                 )
@@ -950,14 +1968,19 @@ class Mussels:
                         alt_version_cookbook = self._select_cookbook(
                             tool_nvc.name, alt_version, cookbook
                         )
-                        alt_tool = self.tools[tool_nvc.name][alt_version["version"]][
-                            alt_version_cookbook
-                        ](self.app_data_dir)
+                        alt_tool = self._detect_tool(
+                            NVC(tool_nvc.name, alt_version["version"], alt_version_cookbook)
+                        )
 
-                        if alt_tool.detect():
+                        if alt_tool is not None:
                             # Found a compatible version to use.
                             tool_found = True
                             toolchain[tool_nvc.name] = alt_tool
+                            toolchain_nvcs[tool_nvc.name] = NVC(
+                                tool_nvc.name,
+                                alt_version["version"],
+                                alt_version_cookbook,
+                            )
 
                             # Select the exact version (pruning all other options) so it will be the default.
                             get_item_version(
@@ -965,6 +1988,13 @@ class Mussels:
                                 self.sorted_tools,
                                 logger=self.logger
                             )
+                            # Forget the earlier selections, they chose the version that's missing.
+                            for key in [
+                                key
+                                for key, nvc in tool_versions.items()
+                                if nvc.name == tool_nvc.name
+                            ]:
+                                del tool_versions[key]
                             self.logger.info(
                                 f"    Alternative version {nvc_str(tool_nvc.name, alt_version['version'], alt_version_cookbook)} found."
                             )
@@ -994,44 +2024,82 @@ class Mussels:
         #FF
         # Perform Build
         #
+        rank, dependents = self._rank_build_graph(graph, batches)
+
+        cas_keys = {}
+        if not dry_run:
+            if cas:
+                cas_keys = self._cas_keys(graph, batches, target)
+
+            self._prefetch_archives(graph, cas_keys, rebuild)
+
         if dry_run:
             self.logger.warning("")
             self.logger.warning(r"    ___   ___   _         ___   _     _    ")
             self.logger.warning(r"   | | \ | |_) \ \_/     | |_) | | | | |\ |")
             self.logger.warning(r"   |_|_/ |_| \  |_|      |_| \ \_\_/ |_| \|")
             self.logger.warning("")
+
+            # The critical path starts at the highest ranked recipe and follows the highest ranked dependents.
+            critical_path = [max(rank, key=rank.get)]
+            while dependents[critical_path[-1]]:
+                critical_path.append(max(dependents[critical_path[-1]], key=rank.get))
+            self.logger.info(
+                f"Critical path: {' -> '.join(nvc_str(nvc.name, nvc.version) for nvc in critical_path)}"
+            )
+            self.logger.info(
+                f"    Minimum build time, based on previous builds: {datetime.timedelta(0, rank[critical_path[0]])}"
+            )
+            self.logger.info("")
             self.logger.info("Build-order of requested recipes:")
 
+        elif jobs > 1:
+            success, results = self._build_parallel(
+                graph,
+                rank,
+                dependents,
+                target,
+                {
+                    name: (toolchain_nvcs[name], toolchain[name].tool_path)
+                    for name in toolchain
+                },
+                rebuild,
+                jobs,
+                cas_keys,
+            )
+            print_results(results)
+
+            self._store_pickle(self._build_cache_path, self._build_cache)
+
+            return success, results
+
+        results = []
         idx = 0
         failure = False
         for i, bundle in enumerate(batches):
+            # Build recipes on the critical path first.
+            bundle = sorted(bundle, key=rank.get, reverse=True)
+
             for j, recipe_nvc in enumerate(bundle):
                 idx += 1
 
-                platform_options = self.recipes[recipe_nvc.name][recipe_nvc.version][
-                    recipe_nvc.cookbook
-                ].platforms.keys()
-                matching_platform = pick_platform(platform.system(), platform_options)
+                matching_platform, target_options = self._recipe_variant(
+                    recipe_nvc, platform.system(), target
+                )
 
                 if dry_run:
                     self.logger.info(
                         f"   {idx:2} [{i}:{j:2}]: {nvc_str(recipe_nvc.name, recipe_nvc.version, recipe_nvc.cookbook)}"
                     )
-                    if (
-                        "required_tools"
-                        in self.recipes[recipe_nvc.name][recipe_nvc.version][
-                            recipe_nvc.cookbook
-                        ].platforms[matching_platform][target]
-                    ):
-                        self.logger.debug(f"      Tool(s):")
-                        for tool in self.recipes[recipe_nvc.name][recipe_nvc.version][
-                            recipe_nvc.cookbook
-                        ].platforms[matching_platform][target]["required_tools"]:
-                            tool_nvc = get_item_version(tool, self.sorted_tools, logger=self.logger)
-                            self.logger.debug(
+                    if "required_tools" in target_options and self.logger.isEnabledFor(logging.DEBUG):
+                        lines = ["      Tool(s):"]
+                        for tool in target_options["required_tools"]:
+                            tool_nvc = get_tool_version(tool)
+                            lines.append(
                                 f"        {nvc_str(tool_nvc.name, tool_nvc.version, tool_nvc.cookbook)}"
                             )
-                        continue
+                        self.logger.debug("\n".join(lines))
+                    continue
 
                 if failure:
                     self.logger.warning(
@@ -1046,17 +2114,22 @@ class Mussels:
                         target,
                         toolchain,
                         rebuild,
+                        cas_keys.get(recipe_nvc, ""),
                     )
                     results.append(result)
                     if not result["success"]:
                         failure = True
+                    elif not result.get("cached", False):
+                        self._build_cache["build_times"][recipe_nvc] = result[
+                            "time elapsed"
+                        ]
 
         if not dry_run:
             print_results(results)
 
-        if failure:
-            return False
-        return True
+        self._store_pickle(self._build_cache_path, self._build_cache)
+
+        return not failure, results
 
     def print_recipe_details(
         self, recipe: str, version: dict, verbose: bool, all: bool
@@ -1073,7 +2146,7 @@ class Mussels:
             for cookbook in cookbooks:
                 self.logger.info(f"      Cookbook: {cookbook}")
 
-                book_recipe = self.recipes[recipe][version_num][cookbook]
+                book_recipe = self._recipe_flat[NVC(recipe, version_num, cookbook)]
 
                 if book_recipe.is_collection:
                     self.logger.info(f"        Collection: Yes")
@@ -1099,9 +2172,17 @@ class Mussels:
                             break
             self.logger.info("")
 
-    def show_recipe(self, recipe_match: str, version_match: str, verbose: bool = False):
+    def show_recipe(
+        self, recipe_match: str, version_match: str, verbose: bool = False, all: bool = False
+    ):
         """
         Search recipes for a specific recipe and print recipe details.
+
+        Args:
+            recipe_match:   The recipe name.
+            version_match:  The recipe version, or an empty string for all versions.
+            verbose:        (optional) Print the details for each platform.
+            all:            (optional) Include the variants for other platforms.
         """
 
         found = False
@@ -1112,26 +2193,11 @@ class Mussels:
             self.logger.info(
                 f'Searching for recipe matching name: "{recipe_match}", version: "{version_match}"...'
             )
-        # Attempt to match the recipe name
-        for recipe in self.sorted_recipes:
-            if fnmatch.fnmatch(recipe, recipe_match):
-                if version_match == "":
-                    found = True
-
-                    # Show info for every version
-                    for version in self.sorted_recipes[recipe]:
-                        self.print_recipe_details(recipe, version, verbose, all)
-                    break
-                else:
-                    # Attempt to match the version too
-                    for version in self.sorted_recipes[recipe]:
-                        if fnmatch.fnmatch(version, version_match):
-                            found = True
+        # Attempt to match the recipe name, and the version too if one was given
+        for recipe, version in _match_versions(self.sorted_recipes, recipe_match, version_match):
+            found = True
 
-                            self.print_recipe_details(recipe, version, verbose, all)
-                            break
-                    if found:
-                        break
+            self.print_recipe_details(recipe, version, verbose, all)
         if not found:
             if version_match == "":
                 self.logger.warning(f'No recipe matching name: "{recipe_match}"')
@@ -1139,6 +2205,7 @@ class Mussels:
                 self.logger.warning(
                     f'No recipe matching name: "{recipe_match}", version: "{version_match}"'
                 )
+            self._log_providers(self._recipe_providers, recipe_match)
 
     def clone_recipe(self, recipe: str, version: str, cookbook: str, destination: str):
         """
@@ -1270,7 +2337,7 @@ class Mussels:
             destination = os.getcwd()
 
         try:
-            recipe_class = self.recipes[recipe][version][cookbook]
+            recipe_class = self._recipe_flat[NVC(recipe, version, cookbook)]
         except KeyError:
             self.logger.error(
                 f'Clone failed: Requested recipe "{nvc_str(recipe, version, cookbook)}" could not be found.'
@@ -1326,8 +2393,6 @@ class Mussels:
         """
         Print out a list of all recipes and all collections.
         """
-        has_collections = False
-
         if len(self.sorted_recipes) == 0:
             if len(self.cookbooks) > 0:
                 self.logger.warning(f"No recipes available from trusted cookbooks.")
@@ -1345,65 +2410,45 @@ class Mussels:
                 self.logger.info(f" or use `mussels update` to download recipes from the public cookbooks.")
                 return
 
-        self.logger.info("Recipes:")
-        for recipe in self.sorted_recipes:
-            newest_version = self.sorted_recipes[recipe][0]["version"]
-            cookbooks = list(self.recipes[recipe][newest_version].keys())
-            if not self.recipes[recipe][newest_version][cookbooks[0]].is_collection:
-                if not verbose:
-                    outline = f"    {recipe:10} "
-                    for i, version in enumerate(self.sorted_recipes[recipe]):
-                        if i == 0:
-                            outline += f" {version['version']}"
-                            if len(self.sorted_recipes[recipe]) > 1:
-                                outline += "*"
-                        else:
-                            outline += f", {version['version']}"
-                    outline += ""
-                    self.logger.info(outline)
-                else:
-                    outline = f"    {recipe:10} "
-                    for i, version in enumerate(self.sorted_recipes[recipe]):
-                        if i == 0:
-                            outline += f" {version['version']} {version['cookbooks']}"
-                            if len(self.sorted_recipes[recipe]) > 1:
-                                outline += "*"
-                        else:
-                            outline += f", {version['version']} {version['cookbooks']}"
-                    outline += ""
-                    self.logger.info(outline)
-
-        for recipe in self.sorted_recipes:
-            newest_version = self.sorted_recipes[recipe][0]["version"]
-            cookbooks = list(self.recipes[recipe][newest_version].keys())
-            if self.recipes[recipe][newest_version][cookbooks[0]].is_collection:
-                if not has_collections:
-                    self.logger.info("")
-                    self.logger.info("Collections:")
-                    has_collections = True
-
-                if not verbose:
-                    outline = f"    {recipe:10} "
-                    for i, version in enumerate(self.sorted_recipes[recipe]):
-                        if i == 0:
-                            outline += f" {version['version']}"
-                            if len(self.sorted_recipes[recipe]) > 1:
-                                outline += "*"
-                        else:
-                            outline += f", {version['version']}"
-                    outline += ""
-                    self.logger.info(outline)
+        recipe_lines, collection_lines = self._recipe_list_lines(verbose)
+
+        # Log the whole listing as one message, rather than one write per recipe.
+        lines = ["Recipes:"] + recipe_lines
+        if collection_lines:
+            lines += ["", "Collections:"] + collection_lines
+        self.logger.info("\n".join(lines))
+
+    def _recipe_list_lines(self, verbose: bool) -> tuple:
+        """
+        Format the lines listing each recipe and each collection.
+
+        Returns:    A tuple of (recipe lines, collection lines).
+        """
+        recipe_lines = []
+        collection_lines = []
+        for recipe, recipe_versions in self.sorted_recipes.items():
+            # Any cookbook's class for the newest version says whether this is a collection.
+            newest_class = next(iter(self.recipes[recipe][recipe_versions[0]["version"]].values()))
+
+            outline = f"    {recipe:10} "
+            for i, version in enumerate(recipe_versions):
+                if i == 0:
+                    outline += f" {version['version']}"
+                    if verbose:
+                        outline += f" {version['cookbooks']}"
+                    if len(recipe_versions) > 1:
+                        outline += "*"
                 else:
-                    outline = f"    {recipe:10} "
-                    for i, version in enumerate(self.sorted_recipes[recipe]):
-                        if i == 0:
-                            outline += f" {version['version']} {version['cookbooks']}"
-                            if len(self.sorted_recipes[recipe]) > 1:
-                                outline += "*"
-                        else:
-                            outline += f", {version['version']} {version['cookbooks']}"
-                    outline += ""
-                    self.logger.info(outline)
+                    outline += f", {version['version']}"
+                    if verbose:
+                        outline += f" {version['cookbooks']}"
+
+            if newest_class.is_collection:
+                collection_lines.append(outline)
+            else:
+                recipe_lines.append(outline)
+
+        return recipe_lines, collection_lines
 
     def print_tool_details(
         self, tool: str, version: dict, verbose: bool, all: bool
@@ -1420,7 +2465,7 @@ class Mussels:
             for cookbook in cookbooks:
                 self.logger.info(f"      Cookbook: {cookbook}")
 
-                book_tool = self.tools[tool][version_num][cookbook]
+                book_tool = self._tool_flat[NVC(tool, version_num, cookbook)]
 
                 self.logger.info(f"        Platforms:")
                 for each_platform in book_tool.platforms:
@@ -1435,9 +2480,17 @@ class Mussels:
                             break
             self.logger.info("")
 
-    def show_tool(self, tool_match: str, version_match: str, verbose: bool = False):
+    def show_tool(
+        self, tool_match: str, version_match: str, verbose: bool = False, all: bool = False
+    ):
         """
         Search tools for a specific tool and print tool details.
+
+        Args:
+            tool_match:     The tool name.
+            version_match:  The tool version, or an empty string for all versions.
+            verbose:        (optional) Print the details for each platform.
+            all:            (optional) Include the variants for other platforms.
         """
 
         found = False
@@ -1448,26 +2501,11 @@ class Mussels:
             self.logger.info(
                 f'Searching for tool matching name: "{tool_match}", version: "{version_match}"...'
             )
-        # Attempt to match the tool name
-        for tool in self.sorted_tools:
-            if fnmatch.fnmatch(tool, tool_match):
-                if version_match == "":
-                    found = True
-
-                    # Show info for every version
-                    for version in self.sorted_tools[tool]:
-                        self.print_tool_details(tool, version, verbose, all)
-                    break
-                else:
-                    # Attempt to match the version too
-                    for version in self.sorted_tools[tool]:
-                        if fnmatch.fnmatch(version, version_match):
-                            found = True
+        # Attempt to match the tool name, and the version too if one was given
+        for tool, version in _match_versions(self.sorted_tools, tool_match, version_match):
+            found = True
 
-                            self.print_tool_details(tool, version, verbose, all)
-                            break
-                    if found:
-                        break
+            self.print_tool_details(tool, version, verbose, all)
         if not found:
             if version_match == "":
                 self.logger.warning(f'No tool matching name: "{tool_match}"')
@@ -1475,6 +2513,7 @@ class Mussels:
                 self.logger.warning(
                     f'No tool matching name: "{tool_match}", version: "{version_match}"'
                 )
+            self._log_providers(self._tool_providers, tool_match)
 
     def clone_tool(self, tool: str, version: str, cookbook: str, destination: str):
         """
@@ -1606,7 +2645,7 @@ class Mussels:
             destination = os.getcwd()
 
         try:
-            tool_class = self.tools[tool][version][cookbook]
+            tool_class = self._tool_flat[NVC(tool, version, cookbook)]
         except KeyError:
             self.logger.error(
                 f'Clone failed: Requested tool "{nvc_str(tool, version, cookbook)}" could not be found.'
@@ -1655,16 +2694,13 @@ class Mussels:
                 return
 
         self.logger.info("Tools:")
-        for tool in self.sorted_tools:
-            newest_version = self.sorted_tools[tool][0]["version"]
-            cookbooks = list(self.tools[tool][newest_version].keys())
-
+        for tool, tool_versions in self.sorted_tools.items():
             if not verbose:
                 outline = f"    {tool:10} "
-                for i, version in enumerate(self.sorted_tools[tool]):
+                for i, version in enumerate(tool_versions):
                     if i == 0:
                         outline += f" {version['version']}"
-                        if len(self.sorted_tools[tool]) > 1:
+                        if len(tool_versions) > 1:
                             outline += "*"
                     else:
                         outline += f", {version['version']}"
@@ -1672,46 +2708,128 @@ class Mussels:
                 self.logger.info(outline)
             else:
                 outline = f"    {tool:10} "
-                for i, version in enumerate(self.sorted_tools[tool]):
+                for i, version in enumerate(tool_versions):
                     if i == 0:
                         outline += f" {version['version']} {version['cookbooks']}"
-                        if len(self.sorted_tools[tool]) > 1:
+                        if len(tool_versions) > 1:
                             outline += "*"
                     else:
                         outline += f", {version['version']} {version['cookbooks']}"
                 outline += ""
                 self.logger.info(outline)
 
-    def update_cookbooks(self) -> None:
+    def _update_cookbook_repo(
+        self, book: str, url: str, repo_dir: str, full_history: bool = False
+    ) -> None:
+        """
+        Clone or pull a single cookbook repository.
+
+        Only the tip of the default branch is needed to read recipes, so unless
+        the cookbook asks for full history we keep a shallow, single-branch clone.
+        """
+        if not os.path.isdir(repo_dir):
+            self.logger.info(f"Cloning {book} cookbook from {url} ...")
+            if full_history:
+                _run_git("clone", "--quiet", "--", url, repo_dir)
+            else:
+                _run_git(
+                    "clone",
+                    "--quiet",
+                    "--depth=1",
+                    "--single-branch",
+                    "--no-tags",
+                    "--",
+                    url,
+                    repo_dir,
+                )
+        else:
+            self.logger.info(f"Pulling {book} cookbook from {url} ...")
+            if (
+                full_history
+                or _run_git("-C", repo_dir, "rev-parse", "--is-shallow-repository") != "true"
+            ):
+                # Full clones, including those made before cookbooks were cloned shallow, stay full.
+                _run_git("-C", repo_dir, "pull", "--ff-only", "--quiet")
+                return
+
+            # Fetching from a shallow clone only downloads the commits it's missing,
+            # and the clone stays shallow.
+            _run_git("-C", repo_dir, "fetch", "--quiet", "--no-tags", "origin", "HEAD")
+
+            if _run_git("-C", repo_dir, "status", "--porcelain") != "":
+                self.logger.warning(
+                    f"Skipping update of {book} cookbook. {repo_dir} has uncommitted changes."
+                )
+                return
+            try:
+                _run_git("-C", repo_dir, "merge-base", "--is-ancestor", "HEAD", "FETCH_HEAD")
+            except Exception:
+                self.logger.warning(
+                    f"Skipping update of {book} cookbook. {repo_dir} has commits that aren't in {url}."
+                )
+                return
+
+            _run_git("-C", repo_dir, "reset", "--quiet", "--hard", "FETCH_HEAD")
+
+    def update_cookbooks(self, jobs: int = 0) -> None:
         """
         Attempt to update each cookbook in using Git to clone or pull each repo.
         If git isn't available, warn the user they should probably install Git and add it to their PATH.
+
+        Args:
+            jobs:   (optional) Max number of repositories to clone or pull at once. 0 for automatic.
         """
         # Create ~/.mussels/bookshelf if it doesn't already exist.
-        os.makedirs(os.path.join(self.app_data_dir, "cookbooks"), exist_ok=True)
+        os.makedirs(self._bookshelf_dir, exist_ok=True)
 
         # Get url for each cookbook from the mussels bookshelf.
-        for book in mussels.bookshelf.cookbooks:
-            repo_dir = os.path.join(self.app_data_dir, "cookbooks", book)
-            self.cookbooks[book]["path"] = repo_dir
-            self.cookbooks[book]["url"] = mussels.bookshelf.cookbooks[book]["url"]
+        for book, shelf_entry in mussels.bookshelf.cookbooks.items():
+            self.cookbooks[book]["url"] = shelf_entry["url"]
             if "trusted" not in self.cookbooks[book]:
                 self.cookbooks[book]["trusted"] = False
 
-        for book in self.cookbooks:
-            repo_dir = os.path.join(self.app_data_dir, "cookbooks", book)
+        # One pass to find each cookbook's directory and the repositories to clone or pull.
+        books = []
+        tasks = []
+        for book, book_config in self.cookbooks.items():
+            repo_dir = os.path.join(self._bookshelf_dir, book)
+            books.append((book, repo_dir))
+
+            if book_config.get("url", "") != "":
+                book_config["path"] = repo_dir
+                tasks.append(
+                    (book, book_config["url"], repo_dir, book_config.get("full_history", False))
+                )
 
-            if "url" in self.cookbooks[book] and self.cookbooks[book]["url"] != "":
-                if not os.path.isdir(repo_dir):
-                    repo = git.Repo.clone_from(self.cookbooks[book]["url"], repo_dir)
-                else:
-                    repo = git.Repo(repo_dir)
-                    repo.git.pull()
+        # Cloning and pulling is network-bound, so do each repository in its own thread.
+        errors = []
+        if len(tasks) > 0:
+            max_workers = min(jobs if jobs > 0 else 16, len(tasks))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(self._update_cookbook_repo, *task): task[0]
+                    for task in tasks
+                }
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        self.logger.error(
+                            f"Failed to update {futures[future]} cookbook.  Exception: {exc}"
+                        )
+                        errors.append(exc)
 
-            self._read_cookbook(book, repo_dir)
+        self._read_cookbooks(books)
 
+        self._store_metadata_cache()
+        self._build_indexes()
+        self._sorted_cookbook_names = sorted(self.cookbooks)
         self._store_config("cookbooks.json", self.cookbooks)
 
+        # Keep what did update, but still report the failure.
+        if len(errors) > 0:
+            raise errors[0]
+
     def list_cookbooks(self, verbose: bool = False):
         """
         Print out a list of all cookbooks.
@@ -1723,156 +2841,286 @@ class Mussels:
             self.logger.info(f" or use `mussels update` to download recipes from the public cookbooks.")
             return
 
-        self.logger.info("Cookbooks:")
-        for cookbook in self.cookbooks:
-            self.logger.info(f"    {cookbook}")
+        if not self.logger.isEnabledFor(logging.INFO):
+            # Nothing below would be shown, so don't bother formatting it.
+            return
+
+        # Log the whole listing as one message, rather than one write per line.
+        lines = ["Cookbooks:"]
+        for cookbook in self._sorted_cookbook_names:
+            book = self.cookbooks[cookbook]
+            lines.append(f"    {cookbook}")
 
             if verbose:
-                if cookbook == "local":
-                    self.logger.info(f"        url:     n/a")
-                else:
-                    self.logger.info(
-                        f"        url:     {self.cookbooks[cookbook]['url']}"
-                    )
-                self.logger.info(f"        path:    {self.cookbooks[cookbook]['path']}")
-                self.logger.info(
-                    f"        trusted: {self.cookbooks[cookbook]['trusted']}"
-                )
-                self.logger.info(f"")
+                lines += self._cookbook_summary_lines(cookbook, book)
+                lines.append("")
+        self.logger.info("\n".join(lines))
 
-    def show_cookbook(self, cookbook_match: str, verbose: bool):
+    def _cookbook_summary_lines(self, cookbook: str, book: dict) -> list:
         """
-        Search cookbooks for a specific cookbook and print the details.
+        Format the url, path, and trust of a cookbook.
         """
-        found = False
+        return [
+            f"        url:     {'n/a' if cookbook == 'local' else book.get('url', '')}",
+            f"        path:    {book.get('path', '')}",
+            f"        trusted: {book.get('trusted', False)}",
+        ]
 
-        self.logger.info(f'Searching for cookbook matching name: "{cookbook_match}"...')
+    def show_cookbook(self, cookbook_match: Union[str, Sequence[str]], verbose: bool):
+        """
+        Search cookbooks for one or more specific cookbooks and print the details.
 
-        # Attempt to match the cookbook name
-        for cookbook in self.cookbooks:
-            if fnmatch.fnmatch(cookbook, cookbook_match):
-                found = True
+        Args:
+            cookbook_match:     A cookbook name or wildcard pattern, or a list of them.
+            verbose:            (optional) Also print the recipes and tools in each cookbook.
+        """
+        patterns = [cookbook_match] if isinstance(cookbook_match, str) else list(cookbook_match)
+        patterns_str = ", ".join(f'"{pattern}"' for pattern in patterns)
 
-                self.logger.info(f"    {cookbook}")
-                if cookbook == "local":
-                    self.logger.info(f"        url:     n/a")
-                else:
-                    self.logger.info(
-                        f"        url:     {self.cookbooks[cookbook]['url']}"
-                    )
-                self.logger.info(f"        path:    {self.cookbooks[cookbook]['path']}")
-                self.logger.info(
-                    f"        trusted: {self.cookbooks[cookbook]['trusted']}"
-                )
+        self.logger.info(f"Searching for cookbook matching name: {patterns_str}...")
 
-                if verbose:
-                    self.logger.info(f"")
-                    if len(self.cookbooks[cookbook]["recipes"].keys()) > 0:
-                        self.logger.info(f"    Recipes:")
-                        for recipe in self.cookbooks[cookbook]["recipes"]:
-                            self.logger.info(
-                                f"        {recipe} : {self.cookbooks[cookbook]['recipes'][recipe]}"
-                            )
-                        self.logger.info(f"")
-                    if len(self.cookbooks[cookbook]["tools"].keys()) > 0:
-                        self.logger.info(f"    Tools:")
-                        for tool in self.cookbooks[cookbook]["tools"]:
-                            self.logger.info(
-                                f"        {tool} : {self.cookbooks[cookbook]['tools'][tool]}"
-                            )
+        if all(
+            not any(c in pattern for c in "*?[") and pattern in self.cookbooks
+            for pattern in patterns
+        ):
+            # Exact names, no need to glob match every cookbook.
+            matches = [(cookbook, self.cookbooks[cookbook]) for cookbook in dict.fromkeys(patterns)]
+        else:
+            # Attempt to match the cookbook names, all patterns in one pass.
+            cookbook_re = _compile_glob(*patterns)
+            matches = [
+                (cookbook, self.cookbooks[cookbook])
+                for cookbook in self._sorted_cookbook_names
+                if cookbook_re.match(cookbook)
+            ]
+
+        if not matches:
+            self.logger.warning(f"No cookbook matching name: {patterns_str}")
+            return
 
-        if not found:
-            self.logger.warning(f'No cookbook matching name: "{cookbook_match}"')
+        if not self.logger.isEnabledFor(logging.INFO):
+            # Nothing below would be shown, so don't bother formatting it.
+            return
+
+        for cookbook, book in matches:
+            lines = [f"    {cookbook}"] + self._cookbook_summary_lines(cookbook, book)
+
+            if verbose:
+                lines.append("")
+                if book.get("recipes"):
+                    lines.append("    Recipes:")
+                    for recipe, versions in book["recipes"].items():
+                        lines.append(f"        {recipe} : {versions}")
+                    lines.append("")
+                if book.get("tools"):
+                    lines.append("    Tools:")
+                    for tool, versions in book["tools"].items():
+                        lines.append(f"        {tool} : {versions}")
+
+            # Log each cookbook as one message, rather than one write per line.
+            self.logger.info("\n".join(lines))
+
+    def _clean_dir(self, path: str, name: str):
+        """
+        Remove a directory tree.
+        """
+        self._log_cleaned(name, _remove_dir(path))
+
+    def _log_cleaned(self, name: str, removed: bool):
+        """
+        Report the result of removing a directory tree.
+        """
+        if removed:
+            self.logger.info(f"{name.capitalize()} directory cleared.")
+        else:
+            self.logger.info(f"No {name} directory to clear.")
+
+    def _detach_log_file(self):
+        """
+        Stop logging to the log file, and close it.
+
+        The handler is removed before it is closed. A closed handler that's still attached
+        would re-open the log file the next time anything is logged.
+        """
+        self.logger.removeHandler(self.filehandler)
+        self.filehandler.close()
 
     def clean_cache(self):
         """
         Clear the cache files.
         """
-        self.logger.info(
-            f"Clearing cache directory ( {os.path.join(self.app_data_dir, 'cache')} )..."
-        )
+        cache_dir = os.path.join(self.app_data_dir, "cache")
+        self.logger.info(f"Clearing cache directory ( {cache_dir} )...")
 
-        if os.path.exists(os.path.join(self.app_data_dir, "cache")):
-            shutil.rmtree(os.path.join(self.app_data_dir, "cache"))
-            self.logger.info(f"Cache directory cleared.")
-        else:
-            self.logger.info(f"No cache directory to clear.")
+        self._clean_dir(cache_dir, "cache")
 
     def clean_install(self):
         """
         Clear the install files.
         """
-        self.logger.info(
-            f"Clearing install directory ( {os.path.join(self.app_data_dir, 'install')} )..."
-        )
+        self.logger.info(f"Clearing install directory ( {self.install_dir} )...")
 
-        if os.path.exists(os.path.join(self.install_dir)):
-            shutil.rmtree(os.path.join(self.install_dir))
-            self.logger.info(f"Install directory cleared.")
-        else:
-            self.logger.info(f"No install directory to clear.")
+        self._clean_dir(self.install_dir, "install")
 
     def clean_logs(self):
         """
         Clear the log files.
         """
-        self.logger.info(
-            f"Clearing logs directory ( {os.path.join(self.app_data_dir, 'logs')} )..."
-        )
+        logs_dir = os.path.join(self.app_data_dir, "logs")
+        self.logger.info(f"Clearing logs directory ( {logs_dir} )...")
 
-        self.filehandler.close()
-        self.logger.removeHandler(self.filehandler)
+        self._detach_log_file()
 
-        if os.path.exists(os.path.join(self.app_data_dir, "logs")):
-            shutil.rmtree(os.path.join(self.app_data_dir, "logs"))
-            self.logger.info(f"Logs directory cleared.")
-        else:
-            self.logger.info(f"No logs directory to clear.")
+        self._clean_dir(logs_dir, "logs")
 
     def clean_all(self):
         """
         Clear all Mussels files.
         """
-        self.clean_cache()
-        self.clean_install()
-        self.clean_logs()
+        dirs = [
+            (os.path.join(self.app_data_dir, "cache"), "cache"),
+            (self.install_dir, "install"),
+            (os.path.join(self.app_data_dir, "logs"), "logs"),
+        ]
+        for path, name in dirs:
+            self.logger.info(f"Clearing {name} directory ( {path} )...")
 
-        self.logger.info(
-            f"Clearing Mussels directory ( {os.path.join(self.app_data_dir)} )..."
-        )
+        # Stop writing to the log file before any directory is removed.
+        self._detach_log_file()
 
-        if os.path.exists(os.path.join(self.app_data_dir)):
-            shutil.rmtree(os.path.join(self.app_data_dir))
-            self.logger.info(f"Mussels directory cleared.")
-        else:
-            self.logger.info(f"No Mussels directory to clear.")
+        # The directories are independent, so remove them concurrently.
+        # Nothing is logged until they're all removed.
+        with ThreadPoolExecutor(max_workers=len(dirs)) as executor:
+            removed = list(executor.map(_remove_dir, [path for path, _ in dirs]))
+
+        for (_, name), was_removed in zip(dirs, removed):
+            self._log_cleaned(name, was_removed)
 
-    def config_trust_cookbook(self, cookbook):
+        self.logger.info(f"Clearing Mussels directory ( {self.app_data_dir} )...")
+
+        self._clean_dir(self.app_data_dir, "Mussels")
+
+    def config_trust_cookbook(self, cookbook, defer_store: bool = False):
         """
         Update config to indicate that a given cookbook is trusted.
+
+        Args:
+            cookbook:       The cookbook name.
+            defer_store:    (optional) Don't write the config until `flush_config()` is called.
         """
         if cookbook not in self.cookbooks:
             self.logger.error(
                 f"Can't trust cookbook '{cookbook}'. Cookbook is unknown."
             )
+            return
+
+        if self.cookbooks[cookbook].get("trusted"):
+            self.logger.info(f"'{cookbook}' cookbook is already trusted.")
+            return
 
         self.logger.info(f"'{cookbook}' cookbook is now trusted.")
 
         self.cookbooks[cookbook]["trusted"] = True
 
-        self._store_config("cookbooks.json", self.cookbooks)
+        self._update_config("cookbooks.json", self.cookbooks, defer_store)
 
-    def config_add_cookbook(self, cookbook, author, url, trust=False):
+    def config_add_cookbook(
+        self, cookbook, author, url, trust=False, full_history=False, defer_store: bool = False
+    ):
         """
         Update config to indicate that a given cookbook is trusted.
+
+        Args:
+            defer_store:    (optional) Don't write the config until `flush_config()` is called.
+        """
+        settings = {
+            "author": author,
+            "url": url,
+            "trusted": trust,
+            "full_history": full_history,
+        }
+        if cookbook not in self.cookbooks:
+            bisect.insort(self._sorted_cookbook_names, cookbook)
+
+        book = self.cookbooks[cookbook]
+        if all(key in book and book[key] == value for key, value in settings.items()):
+            # Nothing changed, no need to rewrite the config.
+            return
+
+        book.update(settings)
+
+        self._update_config("cookbooks.json", self.cookbooks, defer_store)
+
+    def config_remove_cookbook(self, cookbook, defer_store: bool = False):
         """
-        self.cookbooks[cookbook]["author"] = author
-        self.cookbooks[cookbook]["url"] = url
-        self.cookbooks[cookbook]["trusted"] = trust
+        Remove a cookbook from the config.
 
-        self._store_config("cookbooks.json", self.cookbooks)
+        Args:
+            cookbook:       The cookbook name.
+            defer_store:    (optional) Don't write the config until `flush_config()` is called.
+        """
+        if cookbook not in self.cookbooks:
+            self.logger.error(
+                f"Can't remove cookbook '{cookbook}'. Cookbook is unknown."
+            )
+            return
 
-    def config_remove_cookbook(self, cookbook):
         self.cookbooks.pop(cookbook)
-
-        self._store_config("cookbooks.json", self.cookbooks)
+        self._sorted_cookbook_names.remove(cookbook)
+
+        self._update_config("cookbooks.json", self.cookbooks, defer_store)
+
+
+# The Mussels instance and tools each build worker process uses for all of its builds.
+_worker_mussels: Optional[Mussels] = None
+_worker_tools: dict = {}
+
+
+def _init_build_worker(settings: dict) -> None:
+    """
+    Load the Mussels instance for a build worker process, once per process.
+
+    Recipe and tool classes are generated at runtime and can't be pickled, so
+    each worker loads its own Mussels instance rather than receiving them.
+    """
+    global _worker_mussels
+
+    _worker_mussels = Mussels(**settings)
+    _worker_tools.clear()
+
+
+def _build_recipe_worker(
+    recipe_nvc: NVC,
+    platform: str,
+    target: str,
+    toolchain: dict,
+    rebuild: bool,
+    cas_key: str,
+) -> dict:
+    """
+    Build a single recipe in a worker process.
+
+    The toolchain is re-created from the tool NVCs and paths detected by the
+    parent process. Each tool is only created once per worker.
+    """
+    my_mussels = _worker_mussels
+
+    tools = {}
+    for name, (tool_nvc, tool_path) in toolchain.items():
+        tool = _worker_tools.get(tool_nvc)
+        if tool is None:
+            tool = my_mussels._tool_flat[tool_nvc](my_mussels.app_data_dir)
+            _worker_tools[tool_nvc] = tool
+        tool.tool_path = tool_path
+        tools[name] = tool
+
+    return my_mussels._build_recipe(
+        recipe_nvc.name,
+        recipe_nvc.version,
+        recipe_nvc.cookbook,
+        platform,
+        target,
+        tools,
+        rebuild,
+        cas_key,
+    )
@@ -20,8 +20,8 @@ limitations under the License.
 """
 
 import datetime
-from distutils import dir_util
 import glob
+import hashlib
 import inspect
 from io import StringIO
 import logging
@@ -35,12 +35,123 @@ import tarfile
 import time
 import zipfile
 
-import requests
-import urllib.request
-import patch
-
 from mussels.utils.versions import pick_platform, nvc_str
 
+_session = None
+_session_pid = 0
+
+
+def _http_session():
+    """
+    Get the HTTP session shared by all downloads in this process, so that
+    downloads from the same host re-use pooled keep-alive connections.
+    """
+    global _session, _session_pid
+
+    # Don't share pooled sockets with a forked parent process.
+    if _session is None or _session_pid != os.getpid():
+        # Imported here, as only builds download anything.
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3),
+        )
+        _session = requests.Session()
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+        _session_pid = os.getpid()
+
+    return _session
+
+
+def _file_sha256(path: str) -> str:
+    """
+    Get the SHA-256 hex digest of a file.
+    """
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            # Python 3.11+ hashes the file without copying each chunk through Python.
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def _verify_archive(path: str, sha256: str, logger: logging.Logger) -> bool:
+    """
+    Check an archive against a SHA-256 checksum, if there is one.
+    """
+    if sha256 == "":
+        return True
+
+    digest = _file_sha256(path)
+    if digest != sha256:
+        logger.error(f"Checksum mismatch for {os.path.basename(path)}!")
+        logger.error(f"    expected: {sha256}")
+        logger.error(f"    actual:   {digest}")
+        return False
+
+    return True
+
+
+def download_archive(
+    url: str, download_path: str, sha256: str, logger: logging.Logger
+) -> bool:
+    """
+    Download an archive, unless a copy with a matching checksum already exists.
+
+    Safe to call from multiple threads at once for different download paths.
+    """
+    os.makedirs(os.path.dirname(download_path), exist_ok=True)
+
+    # Exit early if we already have the archive.
+    if os.path.exists(download_path):
+        if _verify_archive(download_path, sha256, logger):
+            logger.debug(f"Archive already downloaded.")
+            return True
+
+        logger.warning(f"Removing previously downloaded archive with bad checksum.")
+        os.remove(download_path)
+
+    # One line, so concurrent downloads don't interleave in the log.
+    logger.info(f"Downloading {url} to {download_path} ...")
+
+    # Download to a temporary file so an interrupted download isn't mistaken for the archive.
+    part_path = f"{download_path}.part"
+
+    if url.startswith("ftp"):
+        import urllib.request
+
+        try:
+            urllib.request.urlretrieve(url, part_path)
+        except Exception as exc:
+            logger.info(f"Failed to download archive from {url}, {exc}!")
+            return False
+    else:
+        try:
+            with _http_session().get(url, stream=True, timeout=30) as r:
+                r.raise_for_status()
+                with open(part_path, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+        except Exception as exc:
+            logger.info(f"Failed to download archive from {url}, {exc}!")
+            return False
+
+    if not _verify_archive(part_path, sha256, logger):
+        os.remove(part_path)
+        return False
+
+    os.replace(part_path, download_path)
+
+    return True
+
 
 class BaseRecipe(object):
     """
@@ -56,6 +167,8 @@ class BaseRecipe(object):
 
     url = "https://sample.com/sample.tar.gz"  # URL of project release materials.
 
+    sha256 = ""  # Optional SHA-256 checksum of the archive at the URL.
+
     # archive_name_change is a tuple of strings to replace.
     # For example:
     #     ("v", "nghttp2-")
@@ -160,46 +273,26 @@ class BaseRecipe(object):
         self.logger.addHandler(filehandler)
         self.logger.setLevel(levels[os.environ.get("LOG_LEVEL", level)])
 
-    def _download_archive(self) -> bool:
+    @classmethod
+    def archive_name(cls) -> str:
         """
-        Use the URL to download the archive if it doesn't already exist in the Downloads directory.
+        Determine the archive file name from the URL & possible archive name change.
         """
-        os.makedirs(self.download_dir, exist_ok=True)
-
-        # Determine download path from URL &  possible archive name change.
-        self.archive = self.url.split("/")[-1]
-        if self.archive_name_change[0] != "":
-            self.archive = self.archive.replace(
-                self.archive_name_change[0], self.archive_name_change[1]
+        archive = cls.url.split("/")[-1]
+        if cls.archive_name_change[0] != "":
+            archive = archive.replace(
+                cls.archive_name_change[0], cls.archive_name_change[1]
             )
-        self.download_path = os.path.join(
-            self.download_dir, self.archive
-        )
-
-        # Exit early if we already have the archive.
-        if os.path.exists(self.download_path):
-            self.logger.debug(f"Archive already downloaded.")
-            return True
-
-        self.logger.info(f"Downloading {self.url}")
-        self.logger.info(f"         to {self.download_path} ...")
+        return archive
 
-        if self.url.startswith("ftp"):
-            try:
-                urllib.request.urlretrieve(self.url, self.download_path)
-            except Exception as exc:
-                self.logger.info(f"Failed to download archive from {self.url}, {exc}!")
-                return False
-        else:
-            try:
-                r = requests.get(self.url)
-                with open(self.download_path, "wb") as f:
-                    f.write(r.content)
-            except Exception:
-                self.logger.info(f"Failed to download archive from {self.url}!")
-                return False
+    def _download_archive(self) -> bool:
+        """
+        Use the URL to download the archive if it doesn't already exist in the Downloads directory.
+        """
+        self.archive = self.archive_name()
+        self.download_path = os.path.join(self.download_dir, self.archive)
 
-        return True
+        return download_archive(self.url, self.download_path, self.sha256, self.logger)
 
     def _extract_archive(self, rebuild: bool) -> bool:
         """
@@ -365,6 +458,8 @@ class BaseRecipe(object):
                 os.path.join(self.builds[self.target], "_mussles.patched")
             ):
                 # Not yet patched. Apply patches.
+                import patch
+
                 self.logger.info(
                     f"Applying patches to {nvc_str(self.name, self.version)} ({self.target}) build directory ..."
                 )
@@ -398,8 +493,8 @@ class BaseRecipe(object):
 
         self.variables["includes"] = os.path.join(self.install_dir, "include").replace("\\", "/")
         self.variables["libs"] = os.path.join(self.install_dir, "lib").replace("\\", "/")
-        self.variables["install"] = os.path.join(self.install_dir).replace("\\", "/")
-        self.variables["build"] = os.path.join(self.builds[self.target]).replace("\\", "/")
+        self.variables["install"] = self.install_dir.replace("\\", "/")
+        self.variables["build"] = self.builds[self.target].replace("\\", "/")
         self.variables["target"] = self.target
 
         for tool in self.toolchain:
@@ -428,7 +523,7 @@ class BaseRecipe(object):
 
         if not self.prior_build_exists:
             # Run "configure" script, if exists.
-            if "configure" in build_scripts.keys():
+            if "configure" in build_scripts:
                 if not self._run_script(
                     self.target, "configure", build_scripts["configure"]
                 ):
@@ -442,7 +537,7 @@ class BaseRecipe(object):
             os.chdir(self.builds[self.target])
 
         # Run "make" script, if exists.
-        if "make" in build_scripts.keys():
+        if "make" in build_scripts:
             if not self._run_script(self.target, "make", build_scripts["make"]):
                 self.logger.error(
                     f"{nvc_str(self.name, self.version)} {self.target} build failed."
@@ -451,7 +546,7 @@ class BaseRecipe(object):
                 return False
 
         # Run "install" script, if exists.
-        if "install" in build_scripts.keys():
+        if "install" in build_scripts:
             if not self._run_script(self.target, "install", build_scripts["install"]):
                 self.logger.error(
                     f"{nvc_str(self.name, self.version)} {self.target} build failed."
@@ -473,6 +568,10 @@ class BaseRecipe(object):
         """
         Copy the headers and libs to an install directory.
         """
+        from distutils import dir_util
+
+        self.installed_files = []
+
         os.makedirs(self.install_dir, exist_ok=True)
 
         self.logger.info(
@@ -486,17 +585,21 @@ class BaseRecipe(object):
 
         else:
             install_paths = self.platforms[self.platform][self.target]["install_paths"]
+            build_dir = self.builds[self.target]
 
-            for install_path in install_paths:
+            for install_path, install_items in install_paths.items():
+                # Join the destination directory once for all of its items.
+                dst_dir = os.path.join(self.install_dir, install_path)
 
-                for install_item in install_paths[install_path]:
+                # Create the target install path, if it doesn't already exist.
+                os.makedirs(dst_dir, exist_ok=True)
+
+                for install_item in install_items:
                     item_installed = False
-                    src_path = os.path.join(self.builds[self.target], install_item)
+                    src_path = os.path.join(build_dir, install_item)
 
                     for src_filepath in glob.glob(src_path):
-                        dst_path = os.path.join(
-                            self.install_dir, install_path, os.path.basename(src_filepath)
-                        )
+                        dst_path = os.path.join(dst_dir, os.path.basename(src_filepath))
 
                         # Remove prior installation, if exists.
                         if os.path.isdir(dst_path):
@@ -504,17 +607,17 @@ class BaseRecipe(object):
                         elif os.path.isfile(dst_path):
                             os.remove(dst_path)
 
-                        # Create the target install paths, if it doesn't already exist.
-                        os.makedirs(os.path.split(dst_path)[0], exist_ok=True)
-
                         self.logger.debug(f"Copying: {src_filepath}")
                         self.logger.debug(f"     to: {dst_path}")
 
                         # Now copy the file or directory.
                         if os.path.isdir(src_filepath):
-                            dir_util.copy_tree(src_filepath, dst_path)
+                            self.installed_files += dir_util.copy_tree(
+                                src_filepath, dst_path
+                            )
                         else:
                             shutil.copyfile(src_filepath, dst_path)
+                            self.installed_files.append(dst_path)
 
                         item_installed = True
 
@@ -23,12 +23,10 @@ limitations under the License.
 """
 
 import datetime
-from distutils import dir_util, spawn
 import inspect
 import logging
 import os
 import platform
-import requests
 import shutil
 import stat
 import subprocess
@@ -139,6 +137,8 @@ class BaseTool(object):
         for each_platform in self.platforms:
             if platform_is(each_platform):
                 if "path_checks" in self.platforms[each_platform]:
+                    from distutils import spawn
+
                     for path_check in self.platforms[each_platform]["path_checks"]:
                         self.logger.info(f"  Checking for {path_check} in PATH")
                         install_location = spawn.find_executable(path_check)
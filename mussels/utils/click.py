@@ -21,31 +21,46 @@ import click
 #
 # Click command-group modifiers
 #
-class MusselsModifier(click.Group):
-    def get_command(self, ctx, cmd_name):
-        rv = click.Group.get_command(self, ctx, cmd_name)
-        if rv is not None:
-            return rv
-        matches = [x for x in self.list_commands(ctx) if x.startswith(cmd_name)]
-        if not matches:
-            return None
-        elif len(matches) == 1:
-            return click.Group.get_command(self, ctx, matches[0])
-        ctx.fail("Too many matches: %s" % ", ".join(sorted(matches)))
+class ShortNames(click.Group):
+    """
+    Command group that accepts any unambiguous prefix of a command name.
+    """
 
-    def format_epilog(self, ctx, formatter):
-        if self.epilog:
-            print(self.epilog)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prefix_map = None
 
+    def add_command(self, cmd, name=None):
+        super().add_command(cmd, name)
+        self._prefix_map = None
+
+    def _get_prefix_map(self, ctx) -> dict:
+        """
+        Map every prefix of every command name to the sorted names it matches.
+        """
+        if self._prefix_map is None:
+            prefix_map: dict = {}
+            for name in sorted(self.list_commands(ctx)):
+                for i in range(1, len(name) + 1):
+                    prefix_map.setdefault(name[:i], []).append(name)
+            self._prefix_map = prefix_map
+        return self._prefix_map
 
-class ShortNames(click.Group):
     def get_command(self, ctx, cmd_name):
         rv = click.Group.get_command(self, ctx, cmd_name)
         if rv is not None:
             return rv
-        matches = [x for x in self.list_commands(ctx) if x.startswith(cmd_name)]
+        matches = self._get_prefix_map(ctx).get(cmd_name)
         if not matches:
             return None
         elif len(matches) == 1:
             return click.Group.get_command(self, ctx, matches[0])
-        ctx.fail("Too many matches: %s" % ", ".join(sorted(matches)))
+        ctx.fail("Too many matches: %s" % ", ".join(matches))
+
+
+class MusselsModifier(ShortNames):
+    def format_epilog(self, ctx, formatter):
+        # The epilog may be a function, so it's only built when the help is shown.
+        epilog = self.epilog() if callable(self.epilog) else self.epilog
+        if epilog:
+            print(epilog)
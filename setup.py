@@ -22,13 +22,12 @@ setuptools.setup(
     },
     install_requires=[
         "click>=7.0",
-        "coloredlogs>=10.0",
         "colorama",
         "requests",
         "patch",
-        "gitpython",
         "pyyaml",
     ],
+    extras_require={"fast": ["orjson"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: Apache Software License",
@@ -0,0 +1,151 @@
+"""
+Copyright (C) 2019-2020 Cisco Systems, Inc. and/or its affiliates. All rights reserved.
+
+Tests for the build cache
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+
+from mussels.mussels import Mussels
+from mussels.utils.versions import NVC
+
+A = NVC("a", "1.0", "local")
+D = NVC("d", "1.0", "local")
+
+
+def write_recipe(path: Path, name: str, dependencies: list, make: str = "echo hi"):
+    """
+    Write a recipe that installs one file, for every platform.
+    """
+    variant = f'''
+    host:
+      build_script:
+        make: |
+          {make}
+      dependencies: {dependencies}
+      install_paths:
+        include:
+          - {name}.h
+'''
+    path.write_text(f'''
+name: {name}
+version: "1.0"
+url: https://www.example.com/{name}.tar.gz
+mussels_version: "0.3"
+type: recipe
+platforms:
+  Posix:{variant}
+  Windows:{variant}
+''')
+
+
+class TestClass(unittest.TestCase):
+    def setUp(self):
+        self.path_tmp = Path(tempfile.mkdtemp(prefix="msl-test-"))
+        self.savedir = os.getcwd()
+        os.chdir(str(self.path_tmp))
+
+        (self.path_tmp / "recipes").mkdir()
+        write_recipe(self.path_tmp / "recipes" / "a.yaml", "a", ["d"])
+        write_recipe(self.path_tmp / "recipes" / "d.yaml", "d", [])
+
+        self.instances = []
+
+    def tearDown(self):
+        for my_mussels in self.instances:
+            logging.getLogger("Mussels").removeHandler(my_mussels.filehandler)
+            my_mussels.filehandler.close()
+        os.chdir(self.savedir)
+        shutil.rmtree(str(self.path_tmp))
+
+    def load(self) -> Mussels:
+        my_mussels = Mussels(
+            data_dir=str(self.path_tmp / "data"),
+            install_dir=str(self.path_tmp / "install"),
+        )
+        self.instances.append(my_mussels)
+        return my_mussels
+
+    def cas_keys(self, my_mussels: Mussels) -> dict:
+        graph = my_mussels._get_build_graph("a", platform.system(), "host")
+        batches = my_mussels._get_build_batches(graph)
+        return my_mussels._cas_keys(graph, batches, "host")
+
+    def test_keys_are_stable(self):
+        assert self.cas_keys(self.load()) == self.cas_keys(self.load())
+
+    def test_dependency_change_invalidates_dependents(self):
+        before = self.cas_keys(self.load())
+
+        write_recipe(self.path_tmp / "recipes" / "d.yaml", "d", [], make="echo changed")
+
+        after = self.cas_keys(self.load())
+        assert after[D] != before[D]
+        assert after[A] != before[A]
+
+    def test_dependent_change_keeps_dependency(self):
+        before = self.cas_keys(self.load())
+
+        write_recipe(self.path_tmp / "recipes" / "a.yaml", "a", ["d"], make="echo changed")
+
+        after = self.cas_keys(self.load())
+        assert after[D] == before[D]
+        assert after[A] != before[A]
+
+    def test_install_dir_scripts_are_not_cached(self):
+        write_recipe(
+            self.path_tmp / "recipes" / "a.yaml", "a", ["d"], make="cp a.h {install}/include"
+        )
+
+        keys = self.cas_keys(self.load())
+        assert A not in keys
+        assert D in keys
+
+    def test_store_and_restore(self):
+        my_mussels = self.load()
+        key = self.cas_keys(my_mussels)[D]
+
+        # Miss
+        assert not my_mussels._cas_has(key)
+        assert not my_mussels._cas_restore(key, str(self.path_tmp / "restored"))
+
+        installed = self.path_tmp / "install" / "host" / "include" / "d.h"
+        installed.parent.mkdir(parents=True)
+        installed.write_text("d\n")
+        assert my_mussels._cas_store(key, str(self.path_tmp / "install" / "host"), [str(installed)])
+
+        # Hit
+        assert my_mussels._cas_has(key)
+        restored = self.path_tmp / "restored" / "include" / "d.h"
+        assert my_mussels._cas_restore(key, str(self.path_tmp / "restored"))
+        assert restored.read_text() == "d\n"
+
+        # Changing an installed file must not change the cached build.
+        installed.write_text("changed\n")
+        restored.write_text("changed\n")
+        assert my_mussels._cas_restore(key, str(self.path_tmp / "restored"))
+        assert restored.read_text() == "d\n"
+
+
+if __name__ == "__main__":
+    pytest.main(args=["-v", os.path.abspath(__file__)])
@@ -0,0 +1,97 @@
+"""
+Copyright (C) 2019-2020 Cisco Systems, Inc. and/or its affiliates. All rights reserved.
+
+Tests for ordering and ranking the recipes in a build graph
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+
+from mussels.mussels import Mussels
+from mussels.utils.versions import NVC
+
+A = NVC("a", "1.0", "local")
+B = NVC("b", "1.0", "local")
+C = NVC("c", "1.0", "local")
+D = NVC("d", "1.0", "local")
+
+
+class TestClass(unittest.TestCase):
+    def setUp(self):
+        self.path_tmp = Path(tempfile.mkdtemp(prefix="msl-test-"))
+        self.savedir = os.getcwd()
+        os.chdir(str(self.path_tmp))
+
+        self.my_mussels = Mussels(data_dir=str(self.path_tmp / "data"))
+        self.my_mussels._load_build_cache()
+
+    def tearDown(self):
+        logging.getLogger("Mussels").removeHandler(self.my_mussels.filehandler)
+        self.my_mussels.filehandler.close()
+        os.chdir(self.savedir)
+        shutil.rmtree(str(self.path_tmp))
+
+    def test_batches_follow_dependencies(self):
+        # a needs b & c, which both need d.
+        graph = {A: {B, C}, B: {D}, C: {D}, D: set()}
+
+        batches = self.my_mussels._get_build_batches(graph)
+
+        assert batches == [{D}, {B, C}, {A}]
+
+    def test_batches_independent_recipes(self):
+        graph = {A: set(), B: set(), C: {A}}
+
+        batches = self.my_mussels._get_build_batches(graph)
+
+        assert batches == [{A, B}, {C}]
+
+    def test_batches_circular_dependencies(self):
+        graph = {A: {B}, B: {C}, C: {B}}
+
+        with pytest.raises(ValueError, match="Circular dependencies found!"):
+            self.my_mussels._get_build_batches(graph)
+
+    def test_rank_critical_path(self):
+        # a needs b & c, which both need d. c takes much longer than b.
+        graph = {A: {B, C}, B: {D}, C: {D}, D: set()}
+        self.my_mussels._build_cache["build_times"] = {A: 1.0, B: 2.0, C: 10.0, D: 3.0}
+
+        batches = self.my_mussels._get_build_batches(graph)
+        rank, dependents = self.my_mussels._rank_build_graph(graph, batches)
+
+        assert rank == {A: 1.0, B: 3.0, C: 11.0, D: 14.0}
+        assert sorted(dependents[D]) == [B, C]
+
+        # Of the recipes ready once d is built, c is on the critical path and starts first.
+        assert max(batches[1], key=rank.get) == C
+
+    def test_rank_unknown_build_times(self):
+        graph = {A: {B}, B: set()}
+
+        batches = self.my_mussels._get_build_batches(graph)
+        rank, _ = self.my_mussels._rank_build_graph(graph, batches)
+
+        assert rank == {A: 1.0, B: 2.0}
+
+
+if __name__ == "__main__":
+    pytest.main(args=["-v", os.path.abspath(__file__)])
@@ -0,0 +1,118 @@
+"""
+Copyright (C) 2019-2020 Cisco Systems, Inc. and/or its affiliates. All rights reserved.
+
+Tests for the cache of parsed recipe & tool files
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+
+from mussels.mussels import Mussels
+
+
+def write_recipe(path: Path, name: str, version: str):
+    """
+    Write a recipe for every platform.
+
+    The file's modification time is moved forward, so the change is seen even if the
+    file system's timestamps are too coarse to tell two quick writes apart.
+    """
+    variant = '''
+    host:
+      build_script:
+        make: |
+          echo hi
+      dependencies: []
+'''
+    mtime_ns = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(f'''
+name: {name}
+version: "{version}"
+url: https://www.example.com/{name}.tar.gz
+mussels_version: "0.3"
+type: recipe
+platforms:
+  Posix:{variant}
+  Windows:{variant}
+''')
+    if mtime_ns:
+        os.utime(str(path), ns=(mtime_ns + 1_000_000_000, mtime_ns + 1_000_000_000))
+
+
+class TestClass(unittest.TestCase):
+    def setUp(self):
+        self.path_tmp = Path(tempfile.mkdtemp(prefix="msl-test-"))
+        self.savedir = os.getcwd()
+
+        # A cookbook on the bookshelf, with recipes in a subdirectory like most cookbooks.
+        self.cookbook = self.path_tmp / "data" / "cookbooks" / "book"
+        (self.cookbook / "recipes" / "zed").mkdir(parents=True)
+        (self.cookbook / ".git").mkdir()
+        (self.cookbook / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+        (self.cookbook / ".git" / "index").write_bytes(b"")
+        write_recipe(self.cookbook / "recipes" / "zed" / "zed.yaml", "zed", "1.0")
+
+        # Run from an empty directory, so there are no local recipes.
+        (self.path_tmp / "cwd").mkdir()
+        os.chdir(str(self.path_tmp / "cwd"))
+
+        self.instances = []
+
+    def tearDown(self):
+        for my_mussels in self.instances:
+            logging.getLogger("Mussels").removeHandler(my_mussels.filehandler)
+            my_mussels.filehandler.close()
+        os.chdir(self.savedir)
+        shutil.rmtree(str(self.path_tmp))
+
+    def versions(self, name: str) -> list:
+        my_mussels = Mussels(load_all_recipes=True, data_dir=str(self.path_tmp / "data"))
+        self.instances.append(my_mussels)
+        return [version["version"] for version in my_mussels.sorted_recipes.get(name, [])]
+
+    def test_unchanged(self):
+        assert self.versions("zed") == ["1.0"]
+        assert self.versions("zed") == ["1.0"]
+
+    def test_edited_file(self):
+        assert self.versions("zed") == ["1.0"]
+
+        write_recipe(self.cookbook / "recipes" / "zed" / "zed.yaml", "zed", "2.0")
+
+        assert self.versions("zed") == ["2.0"]
+
+    def test_added_file(self):
+        assert self.versions("yak") == []
+
+        write_recipe(self.cookbook / "recipes" / "zed" / "yak.yaml", "yak", "1.0")
+
+        assert self.versions("yak") == ["1.0"]
+
+    def test_removed_file(self):
+        assert self.versions("zed") == ["1.0"]
+
+        os.remove(str(self.cookbook / "recipes" / "zed" / "zed.yaml"))
+
+        assert self.versions("zed") == []
+
+
+if __name__ == "__main__":
+    pytest.main(args=["-v", os.path.abspath(__file__)])
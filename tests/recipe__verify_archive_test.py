@@ -0,0 +1,59 @@
+"""
+Copyright (C) 2019-2020 Cisco Systems, Inc. and/or its affiliates. All rights reserved.
+
+Tests for verifying downloaded archives
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import pytest
+
+from mussels.recipe import _verify_archive
+
+CONTENT = b"Hello, World!\n"
+
+
+class TestClass(unittest.TestCase):
+    def setUp(self):
+        self.path_tmp = Path(tempfile.mkdtemp(prefix="msl-test-"))
+        self.archive = self.path_tmp / "foo.tar.gz"
+        self.archive.write_bytes(CONTENT)
+        self.logger = logging.getLogger("verify_archive_test")
+
+    def tearDown(self):
+        shutil.rmtree(str(self.path_tmp))
+
+    def test_matching_checksum(self):
+        sha256 = hashlib.sha256(CONTENT).hexdigest()
+
+        assert _verify_archive(str(self.archive), sha256, self.logger)
+
+    def test_checksum_mismatch(self):
+        sha256 = hashlib.sha256(b"Something else\n").hexdigest()
+
+        assert not _verify_archive(str(self.archive), sha256, self.logger)
+
+    def test_no_checksum(self):
+        assert _verify_archive(str(self.archive), "", self.logger)
+
+
+if __name__ == "__main__":
+    pytest.main(args=["-v", os.path.abspath(__file__)])
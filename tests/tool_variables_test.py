@@ -47,14 +47,11 @@ def execute_build(stdout, stderr):
         download_dir=os.getcwd(),
     )
 
-    results = []
-
-    success = my_mussels.build_recipe(
+    success, _ = my_mussels.build_recipe(
         recipe="foobar",
         version="",
         cookbook="",
         target="host",
-        results=results,
         dry_run=False,
         rebuild=False
     )
@@ -160,14 +157,11 @@ platforms:
             log_level="DEBUG"
         )
 
-        results = []
-
-        success = my_mussels.build_recipe(
+        success, _ = my_mussels.build_recipe(
             recipe="foobar",
             version="",
             cookbook="",
             target="host",
-            results=results,
             dry_run=False,
             rebuild=False
         )